@@ -0,0 +1,108 @@
+"""Бенчмарк конкурентного доступа к кэшу: тысячи одновременных get_user.
+
+Запуск из корня репозитория (используется временная база, рабочая
+data/tarot.db не затрагивается):
+
+    python benchmarks/bench_cache_contention.py [--users 2000] [--tasks 2000] [--calls 50]
+
+--tasks корутин одновременно выполняют по --calls вызовов; каждый
+--write-every-й вызов — запись в кэш (update_user), остальные — чтение
+UserManager.get_user по прогретому кэшу. Печатаются пропускная способность
+и задержки вызовов (медиана и p99) для чтения через CacheManager.get и
+полного UserManager.get_user. Лучший из пяти повторов.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Лучший из нескольких повторов: меньше влияния фоновой нагрузки
+REPEATS = 5
+
+async def run_tasks(tasks: int, calls: int, call, write_every: int, write) -> tuple:
+    """Запуск tasks корутин по calls вызовов; (вызовов в секунду, задержки)."""
+    latencies = []
+
+    async def worker(seed: int):
+        rnd = random.Random(seed)
+        for i in range(calls):
+            start = time.perf_counter()
+            if write_every and i % write_every == write_every - 1:
+                await write(rnd)
+            else:
+                await call(rnd)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(seed) for seed in range(tasks)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return tasks * calls / elapsed, latencies
+
+async def best_of(tasks: int, calls: int, call, write_every: int, write) -> tuple:
+    best = None
+    for _ in range(REPEATS):
+        result = await run_tasks(tasks, calls, call, write_every, write)
+        if best is None or result[0] > best[0]:
+            best = result
+    throughput, latencies = best
+    return throughput, latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--write-every', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='tarot-bench-')
+    os.chdir(workdir)
+    # Логи get_user на каждое попадание в кэш не нужны в замере
+    logging.disable(logging.INFO)
+    from utils.cluster_manager import ClusterManager
+    from utils.user_manager import UserManager
+
+    cluster = ClusterManager()
+    await cluster.register_node(cluster._node_id, 'localhost', 0)
+    users = UserManager()
+    await users.db.bulk_update_users({'user_id': user_id, 'theme': 'dark'} for user_id in range(1, args.users + 1))
+    for user_id in range(1, args.users + 1):
+        await users.get_user(user_id)
+    cache = users.cache
+
+    async def cache_get(rnd: random.Random):
+        await cache.get(f"user_{rnd.randint(1, args.users)}")
+
+    async def get_user(rnd: random.Random):
+        await users.get_user(rnd.randint(1, args.users))
+
+    async def cache_set(rnd: random.Random):
+        user_id = rnd.randint(1, args.users)
+        await cache.set(f"user_{user_id}", {'user_id': user_id, 'theme': 'dark'}, ttl=1800)
+
+    results = [
+        ('CacheManager.get', 'чтение', await best_of(args.tasks, args.calls, cache_get, 0, cache_set)),
+        ('CacheManager.get', f'1/{args.write_every} set',
+         await best_of(args.tasks, args.calls, cache_get, args.write_every, cache_set)),
+        ('get_user', 'чтение', await best_of(args.tasks, args.calls, get_user, 0, cache_set)),
+        ('get_user', f'1/{args.write_every} set',
+         await best_of(args.tasks, args.calls, get_user, args.write_every, cache_set)),
+    ]
+    users.db.close()
+
+    print(f"{args.tasks} корутин x {args.calls} вызовов")
+    print(f"{'вызов':<18} {'нагрузка':<10} {'вызовов/с':>11} {'медиана мкс':>12} {'p99 мкс':>9}")
+    for name, mix, (throughput, median, p99) in results:
+        print(f"{name:<18} {mix:<10} {throughput:>11.0f} {median:>12.1f} {p99:>9.1f}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""Бенчмарк удаленного чтения кэша через node_api.
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_node_http.py [--calls 2000] [--concurrency 32] [--port 8765]
+
+Во вложенном процессе поднимается utils.node_api (заменитель соседнего
+узла), в нём сохраняются записи карт, затем из основного процесса
+читаются ключи:
+  before — новая aiohttp.ClientSession на каждый вызов (прежний CacheManager.get);
+  pooled — CacheManager.get через общий HttpClient с keep-alive.
+Ближний кэш и репликация горячих ключей выключены (CACHE_NEAR_TTL=0,
+CACHE_HOT_KEY_REPLICAS=1) в обоих процессах, иначе pooled измерял бы
+чтение копий в памяти, а не запросы к узлу.
+Печатаются медиана и p99 задержки вызова при последовательных вызовах
+и пропускная способность при --concurrency одновременных вызовах.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import aiohttp
+
+async def wait_ready(url: str, timeout: float = 15) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{url}/stats") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("node_api не запустился")
+            await asyncio.sleep(0.2)
+
+async def sequential(call, keys, calls: int) -> tuple:
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        await call(keys[i % len(keys)])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+async def concurrent(call, keys, calls: int, concurrency: int) -> float:
+    counter = iter(range(calls))
+
+    async def worker():
+        for i in counter:
+            await call(keys[i % len(keys)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return calls / (time.perf_counter() - start)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    # До импорта config; вложенный процесс наследует окружение
+    os.environ['CACHE_NEAR_TTL'] = '0'
+    os.environ['CACHE_HOT_KEY_REPLICAS'] = '1'
+    server = subprocess.Popen(
+        [sys.executable, '-c', f"from utils.node_api import start_node_api; start_node_api('127.0.0.1', {args.port})"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f"http://127.0.0.1:{args.port}"
+        await wait_ready(url)
+
+        from utils.cluster_manager import ClusterManager
+        from utils.cache_manager import CacheManager
+        from utils.http_client import HttpClient
+
+        # Единственный узел кольца — заменитель, все ключи удаленные
+        cluster = ClusterManager()
+        await cluster.register_node('bench_node', '127.0.0.1', args.port)
+        cache = CacheManager()
+
+        with open('data/tarot_deck.json', encoding='utf-8') as f:
+            deck = json.load(f)
+        entries = {f"card_{name}": card for name, card in deck["Старшие арканы"].items()}
+        await cache.set_many(entries)
+        keys = list(entries)
+
+        async def before(key: str):
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{url}/cache/{key}") as response:
+                    return (await response.json())["value"]
+
+        results = []
+        for name, call in (('before', before), ('pooled', cache.get)):
+            # Прогрев: соединения пула и кэш узла
+            await sequential(call, keys, 50)
+            median, p99 = await sequential(call, keys, args.calls)
+            throughput = await concurrent(call, keys, args.calls, args.concurrency)
+            results.append((name, median, p99, throughput))
+        await HttpClient().close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'клиент':<8} {'медиана мкс':>12} {'p99 мкс':>9} {f'вызовов/с x{args.concurrency}':>16}")
+    for name, median, p99, throughput in results:
+        print(f"{name:<8} {median:>12.0f} {p99:>9.0f} {throughput:>16.0f}")
+
+if __name__ == '__main__':
+    asyncio.run(main())
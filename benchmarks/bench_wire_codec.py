@@ -0,0 +1,69 @@
+"""Бенчмарк форматов передачи значений кэша (utils.wire_codec).
+
+Запуск из корня репозитория:
+
+    python benchmarks/bench_wire_codec.py [--repeats 2000]
+
+Кодируются реальные записи data/tarot_deck.json в том виде, в каком
+CardManager кладёт их в кэш: {"value": <карта>} для одной карты и
+{"items": {...}} для пакетной записи всей колоды. Для каждого формата
+(JSON, pickle, msgpack — если установлен) и сжатия (нет, zlib, zstd —
+если установлен zstandard) печатаются размер тела и медианное время
+кодирования и декодирования.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils import wire_codec
+
+def load_payloads() -> dict:
+    with open(ROOT / 'data' / 'tarot_deck.json', encoding='utf-8') as f:
+        deck = json.load(f)
+    cards = {f"card_{name}": card for name, card in deck["Старшие арканы"].items()}
+    for suit_cards in deck["Младшие арканы"].values():
+        cards.update({f"card_{name}": card for name, card in suit_cards.items()})
+    key = next(iter(cards))
+    return {
+        'одна карта': {"value": cards[key]},
+        f'колода ({len(cards)})': {"items": cards, "ttl": None}
+    }
+
+def median_us(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+
+    content_types = [('json', wire_codec.JSON), ('pickle', wire_codec.PICKLE)]
+    if wire_codec.msgpack is not None:
+        content_types.append(('msgpack', wire_codec.MSGPACK))
+    compressions = [('-', ())] + [(name, (name,)) for name in wire_codec.COMPRESSIONS]
+
+    print(f"Порог сжатия: {wire_codec.WIRE_COMPRESS_MIN_BYTES} байт")
+    for title, payload in load_payloads().items():
+        print(f"\n{title}")
+        print(f"{'формат':<8} {'сжатие':<6} {'байт':>8} {'encode мкс':>11} {'decode мкс':>11}")
+        for type_name, content_type in content_types:
+            for compression_name, allowed in compressions:
+                body, used = wire_codec.encode(payload, content_type, allowed)
+                assert wire_codec.decode(body, content_type, used) == payload
+                encode_us = median_us(lambda: wire_codec.encode(payload, content_type, allowed), args.repeats)
+                decode_us = median_us(lambda: wire_codec.decode(body, content_type, used), args.repeats)
+                print(f"{type_name:<8} {used or '-':<6} {len(body):>8} {encode_us:>11.1f} {decode_us:>11.1f}")
+
+if __name__ == '__main__':
+    main()
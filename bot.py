@@ -8,6 +8,11 @@ from utils.database import Database
 from utils.user_manager import UserManager
 from utils.card_manager import CardManager
 from utils.monitoring import BotMonitor
+from utils.db_retention import SpreadRetention
+from utils.db_backup import DatabaseBackup
+from utils.db_maintenance import DatabaseMaintenance
+from utils.memory_pressure import MemoryPressure
+from utils.http_client import HttpClient
 from aiogram.types import Message
 from functools import wraps
 import time
@@ -97,6 +102,12 @@ class BotManager:
         await self.user_manager.cache.start_cleanup()
         await self.card_manager.cache.start_cleanup()
         
+        # Запускаем замер давления на память: по нему кэши сжимают бюджеты
+        self.memory_pressure = MemoryPressure()
+        self._cleanup_tasks.append(
+            asyncio.create_task(self.memory_pressure.run())
+        )
+        
         # Регистрируем хендлеры с декоратором логирования
         register_handlers(dp, log_command(self.monitor))
         
@@ -124,6 +135,24 @@ class BotManager:
         self._cleanup_tasks.append(
             asyncio.create_task(self.monitor.monitor_resources())
         )
+        
+        # Запускаем свертку и удаление старых раскладов
+        self.spread_retention = SpreadRetention()
+        self._cleanup_tasks.append(
+            asyncio.create_task(self.spread_retention.run())
+        )
+        
+        # Запускаем онлайн-резервное копирование базы данных
+        self.db_backup = DatabaseBackup()
+        self._cleanup_tasks.append(
+            asyncio.create_task(self.db_backup.run())
+        )
+        
+        # Запускаем ежедневное обслуживание базы данных
+        self.db_maintenance = DatabaseMaintenance()
+        self._cleanup_tasks.append(
+            asyncio.create_task(self.db_maintenance.run())
+        )
     
     async def on_shutdown(self, dp: Dispatcher):
         """Действия при остановке бота."""
@@ -143,7 +172,13 @@ class BotManager:
                 await task
             except asyncio.CancelledError:
                 pass
-    
+
+        # Закрываем пул HTTP-соединений между узлами
+        await HttpClient().close()
+
+        # Закрываем соединения с базой данных
+        self.db.close()
+
     def run(self):
         """Запуск бота."""
         executor.start_polling(
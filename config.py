@@ -7,4 +7,71 @@ TAROT_DECK_FILE = "data/tarot_deck.json"
 SAVED_SPREADS_FILE = "data/saved_spreads.json"
 
 # Пути к изображениям
-IMAGES_PATH = "/app/images/tarot/" 
\ No newline at end of file
+IMAGES_PATH = "/app/images/tarot/" 
+
+# Максимальное количество раскладов в день
+MAX_DAILY_SPREADS = int(os.getenv("MAX_DAILY_SPREADS", "3"))
+
+# Отложенная запись в базу данных
+DB_FLUSH_INTERVAL_MS = int(os.getenv("DB_FLUSH_INTERVAL_MS", "50"))
+DB_FLUSH_MAX_ROWS = int(os.getenv("DB_FLUSH_MAX_ROWS", "200"))
+
+# Хранение истории раскладов: более старые расклады сворачиваются
+# в дневные агрегаты и удаляются (0 — хранить всё)
+SPREAD_RETENTION_DAYS = int(os.getenv("SPREAD_RETENTION_DAYS", "365"))
+SPREAD_RETENTION_BATCH = int(os.getenv("SPREAD_RETENTION_BATCH", "500"))
+
+# Онлайн-резервное копирование базы данных
+BACKUP_DIR = os.getenv("BACKUP_DIR", "data/backups")
+BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") not in ("0", "false", "no")
+
+# Число шардов базы данных по user_id (1 — один файл data/tarot.db).
+# Перед включением существующую базу нужно разбить: python -m utils.db_split --shards N
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+
+# Размер пачки потокового импорта JSON в Database.migrate_data
+DB_IMPORT_BATCH = int(os.getenv("DB_IMPORT_BATCH", "1000"))
+
+# Профиль настроек соединений SQLite: throughput или durability
+DB_PRAGMA_PROFILE = os.getenv("DB_PRAGMA_PROFILE", "throughput")
+
+# Ежедневное обслуживание базы (ANALYZE, optimize, incremental vacuum)
+# в час наименьшей нагрузки по локальному времени
+DB_MAINTENANCE_HOUR = int(os.getenv("DB_MAINTENANCE_HOUR", "4"))
+DB_VACUUM_PAGES = int(os.getenv("DB_VACUUM_PAGES", "256"))
+
+# Лимиты локального кэша CacheManager (вытеснение по LRU)
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Замер давления на память (доля лимита cgroup контейнера или памяти хоста):
+# при HIGH бюджеты кэшей уменьшаются вдвое, при CRITICAL — вчетверо
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "5"))
+MEMORY_PRESSURE_HIGH = float(os.getenv("MEMORY_PRESSURE_HIGH", "0.75"))
+MEMORY_PRESSURE_CRITICAL = float(os.getenv("MEMORY_PRESSURE_CRITICAL", "0.9"))
+
+# Число виртуальных узлов на каждый узел кластера в кольце консистентного хэширования
+CLUSTER_VNODES = int(os.getenv("CLUSTER_VNODES", "160"))
+
+# Общий HTTP-клиент для обмена между узлами кластера
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "32"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Ближний кэш значений других узлов кластера (0 — выключен)
+CACHE_NEAR_TTL = float(os.getenv("CACHE_NEAR_TTL", "5"))
+CACHE_NEAR_MAX_ENTRIES = int(os.getenv("CACHE_NEAR_MAX_ENTRIES", "1000"))
+
+# Значения кэша между узлами сжимаются, начиная с этого размера тела
+WIRE_COMPRESS_MIN_BYTES = int(os.getenv("WIRE_COMPRESS_MIN_BYTES", "1024"))
+
+# Репликация горячих ключей кэша: ключ, прочитанный у владельца не меньше
+# CACHE_HOT_KEY_THRESHOLD раз за CACHE_HOT_KEY_WINDOW секунд, копируется на
+# CACHE_HOT_KEY_REPLICAS узлов кольца вместе с владельцем (меньше 2 — выключено).
+# Чтения из ближнего кэша других узлов учитываются: узлы сообщают их владельцу
+CACHE_HOT_KEY_REPLICAS = int(os.getenv("CACHE_HOT_KEY_REPLICAS", "3"))
+CACHE_HOT_KEY_THRESHOLD = int(os.getenv("CACHE_HOT_KEY_THRESHOLD", "100"))
+CACHE_HOT_KEY_WINDOW = float(os.getenv("CACHE_HOT_KEY_WINDOW", "10"))
+CACHE_HOT_KEYS_MAX = int(os.getenv("CACHE_HOT_KEYS_MAX", "32"))
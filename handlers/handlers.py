@@ -183,7 +183,14 @@ async def handle_theme(message: types.Message):
     # Убираем эмодзи из темы
     theme = message.text.split(' ', 1)[1] if ' ' in message.text else message.text
     
-    if not await user_manager.can_make_spread(user_id):
+    try:
+        reserved = await user_manager.reserve_spread(user_id)
+    except Exception as e:
+        logging.error(f"Ошибка при проверке лимита раскладов пользователя {user_id}: {e}")
+        await message.reply("❌ Не удалось сделать расклад. Пожалуйста, попробуйте позже.")
+        return
+
+    if not reserved:
         await message.reply(
             "⚠️ *Лимит раскладов на сегодня достигнут*\n\n"
             "🌙 Карты Таро нуждаются в отдыхе, чтобы восстановить свою магическую силу.\n"
@@ -209,7 +216,6 @@ async def handle_theme(message: types.Message):
     card_manager = CardManager()
     cards = card_manager.generate_spread()
     user_data[str(user_id)] = {"theme": actual_theme, "cards": cards}
-    await user_manager.increment_spreads(user_id)
     await card_manager.save_spread(str(user_id), actual_theme, cards)
     
     cards_keyboard = ReplyKeyboardMarkup(resize_keyboard=True, one_time_keyboard=True)
@@ -486,62 +492,63 @@ async def handle_settings_callback(callback: types.CallbackQuery):
         logging.warning("Сообщение не изменилось, пропускаем обновление")
         pass
 
-async def send_daily_prediction(bot: Bot):
-    subscribers = await user_manager.get_daily_prediction_subscribers()
+async def send_daily_prediction(bot: Bot, after_id: int = 0):
     card_manager = CardManager()
     
-    for user_id in subscribers:
-        try:
-            user = await user_manager.get_user(user_id)
-            card = await card_manager.get_random_card()
+    # Подписчики читаются пачками по user_id, полный список в памяти не держим
+    async for subscribers in user_manager.iter_daily_prediction_subscribers(after_id=after_id):
+        for user_id in subscribers:
+            try:
+                user = await user_manager.get_user(user_id)
+                card = await card_manager.get_random_card()
             
-            message_text = (
-                "✨ *Ваше Предсказание на Сегодня* ✨\n\n"
-                f"🎴 Карта дня: *{card['ru']}*\n\n"
-                f"📜 Послание карты:\n└ _{card['Карта на сегодня']}_\n\n"
-                "🌟 Пусть этот день принесёт вам мудрость и озарение!\n"
-                "└ _Ваш мистический проводник_"
-            )
+                message_text = (
+                    "✨ *Ваше Предсказание на Сегодня* ✨\n\n"
+                    f"🎴 Карта дня: *{card['ru']}*\n\n"
+                    f"📜 Послание карты:\n└ _{card['Карта на сегодня']}_\n\n"
+                    "🌟 Пусть этот день принесёт вам мудрость и озарение!\n"
+                    "└ _Ваш мистический проводник_"
+                )
             
-            # Удаляем предыдущее сообщение бота, если оно есть
-            if user_id in last_messages and "bot" in last_messages[user_id]:
-                try:
-                    await bot.delete_message(user_id, last_messages[user_id]["bot"])
-                except Exception as e:
-                    logging.warning(f"Не удалось удалить предыдущее предсказание: {e}")
+                # Удаляем предыдущее сообщение бота, если оно есть
+                if user_id in last_messages and "bot" in last_messages[user_id]:
+                    try:
+                        await bot.delete_message(user_id, last_messages[user_id]["bot"])
+                    except Exception as e:
+                        logging.warning(f"Не удалось удалить предыдущее предсказание: {e}")
             
-            # Отправляем новое предсказание
-            if user["show_images"]:
-                image_name = get_card_image_name(card['en'])
-                image_path = os.path.join(IMAGES_DIR, f"{image_name}.jpg")
-                if os.path.exists(image_path):
-                    sent_message = await bot.send_photo(
-                        user_id,
-                        photo=InputFile(image_path),
-                        caption=message_text,
-                        parse_mode="Markdown"
-                    )
+                # Отправляем новое предсказание
+                if user["show_images"]:
+                    image_name = get_card_image_name(card['en'])
+                    image_path = os.path.join(IMAGES_DIR, f"{image_name}.jpg")
+                    if os.path.exists(image_path):
+                        sent_message = await bot.send_photo(
+                            user_id,
+                            photo=InputFile(image_path),
+                            caption=message_text,
+                            parse_mode="Markdown"
+                        )
+                    else:
+                        sent_message = await bot.send_message(
+                            user_id,
+                            message_text,
+                            parse_mode="Markdown"
+                        )
                 else:
                     sent_message = await bot.send_message(
                         user_id,
                         message_text,
                         parse_mode="Markdown"
                     )
-            else:
-                sent_message = await bot.send_message(
-                    user_id,
-                    message_text,
-                    parse_mode="Markdown"
-                )
             
-            # Сохраняем только ID сообщения бота
-            last_messages[user_id] = {
-                "bot": sent_message.message_id
-            }
+                # Сохраняем только ID сообщения бота
+                last_messages[user_id] = {
+                    "bot": sent_message.message_id
+                }
                 
-        except Exception as e:
-            logging.error(f"Ошибка при отправке дневного предсказания пользователю {user_id}: {e}")
-            continue
+            except Exception as e:
+                logging.error(f"Ошибка при отправке дневного предсказания пользователю {user_id}: {e}")
+                continue
 
 async def handle_guess_card_game(message: types.Message):
     """Начинает новую игру 'Угадай карту'."""
@@ -831,14 +838,21 @@ async def handle_admin_stats(callback: types.CallbackQuery):
         await callback.answer("⛔️ Доступ запрещен")
         return
         
-    total_users = len(user_manager.users)
-    daily_subscribers = len(user_manager.get_daily_prediction_subscribers())
+    # Счетчики читаются из таблицы counters, без COUNT(*) по истории
+    stats = await user_manager.db.get_stats()
+    queue = user_manager.db.get_write_queue_stats()
     
     stats_text = (
         "📊 *Статистика бота*\n\n"
-        f"👥 Всего пользователей: {total_users}\n"
-        f"🔔 Подписчиков на рассылку: {daily_subscribers}\n"
-        "└ _(Будет дополняться)_"
+        f"👥 Всего пользователей: {stats.get('total_users', 0)}\n"
+        f"🔔 Подписчиков на рассылку: {stats.get('daily_subscribers', 0)}\n"
+        f"🎴 Всего раскладов: {stats.get('total_spreads', 0)}\n"
+        f"🕐 Раскладов за 24 часа: {stats.get('spreads_last_24h', 0)}\n\n"
+        "💾 *Очередь записи*\n"
+        f"Ожидают записи: {queue['queue_depth']}\n"
+        f"Сброс: {queue['avg_flush_latency'] * 1000:.1f} мс в среднем, "
+        f"{queue['max_flush_latency'] * 1000:.1f} мс максимум\n"
+        f"Ошибок сброса: {queue['failed_flushes']}, отброшено строк: {queue['dropped_rows']}"
     )
     
     keyboard = InlineKeyboardMarkup().add(
@@ -1,14 +1,29 @@
+import heapq
 import logging
 import time
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 import asyncio
-import psutil
 import gc
 import json
-import aiohttp
-from .cluster_manager import ClusterManager
+import random
+from collections import OrderedDict
+from config import (
+    CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_NEAR_TTL, CACHE_NEAR_MAX_ENTRIES,
+    CACHE_HOT_KEY_REPLICAS, CACHE_HOT_KEY_THRESHOLD, CACHE_HOT_KEY_WINDOW, CACHE_HOT_KEYS_MAX
+)
+from .cluster_manager import ClusterManager, NodeInfo
+from .http_client import HttpClient
+from .near_cache import NearCache
+from .hot_keys import HotKeyTracker
+from . import wire_codec
+from .size_estimate import estimate_size
+from .memory_pressure import MemoryPressure, PRESSURE_CRITICAL
+
+# Маркер отсутствующего ключа: None — допустимое значение в кэше
+_MISSING = object()
 
 class CacheManager:
+    """Распределенный кэш: локальное LRU-хранилище с TTL, ближний кэш чужих ключей и реплики горячих ключей."""
     _instance = None
     _initialized = False
     
@@ -19,56 +34,110 @@ class CacheManager:
     
     def __init__(self):
         if not self._initialized:
-            self._cache = {}
-            self._timestamps = {}
-            self._max_memory_percent = 75
-            self._cleanup_threshold = 1000
+            self._cache: OrderedDict[str, Any] = OrderedDict()
+            self._expires: Dict[str, float] = {}
+            # Куча (expires_at, key); устаревшие пары после перезаписи ключа
+            # пропускаются при снятии и убираются при перестроении кучи
+            self._expiry_heap: List[Tuple[float, str]] = []
+            self._sizes: Dict[str, int] = {}
+            self._total_bytes = 0
+            self._max_entries = CACHE_MAX_ENTRIES
+            self._max_bytes = CACHE_MAX_BYTES
+            self._pressure = MemoryPressure()
+            self._pressure.add_listener(self._on_memory_pressure)
+            self._stats = {
+                "hits": 0,
+                "misses": 0,
+                "evictions": 0,
+                "evicted_bytes": 0,
+                "expirations": 0,
+                "loads": 0,
+                "loads_deduplicated": 0,
+                "invalidations_sent": 0,
+                "replica_reads": 0,
+                "replica_fallbacks": 0,
+                "replications_sent": 0
+            }
+            # Загрузки get_or_load в процессе: ключ -> задача загрузки
+            self._inflight: Dict[str, asyncio.Task] = {}
             self._default_ttl = 3600
-            self._lock = asyncio.Lock()
             self._initialized = True
             self._cleanup_task = None
             self._cluster = ClusterManager()
-            self._partition_count = 100  # Количество партиций для шардинга
+            self._http = HttpClient()
+            self._near = NearCache(CACHE_NEAR_TTL, CACHE_NEAR_MAX_ENTRIES) if CACHE_NEAR_TTL > 0 else None
+            # Формат тела запросов к узлу: (Content-Type, сжатие), из его ответов
+            self._peer_formats: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+            # Ключи, ожидающие рассылки инвалидации, и задача рассылки
+            self._pending_invalidations: set = set()
+            self._invalidation_task: Optional[asyncio.Task] = None
+            # Репликация горячих ключей. У владельца: счетчики чтений и узлы
+            # с копиями каждого горячего ключа; у реплики: ключи, хранимые
+            # копией; у читающего: (срок, узлы с копиями) по подсказкам владельца
+            self._replica_count = CACHE_HOT_KEY_REPLICAS
+            self._replica_lease = 3 * CACHE_HOT_KEY_WINDOW
+            self._hot_keys = HotKeyTracker(
+                CACHE_HOT_KEY_THRESHOLD,
+                max(1, CACHE_HOT_KEY_THRESHOLD // (2 * CACHE_HOT_KEY_REPLICAS)),
+                CACHE_HOT_KEY_WINDOW,
+                CACHE_HOT_KEYS_MAX
+            ) if CACHE_HOT_KEY_REPLICAS > 1 else None
+            self._hot_replicas: Dict[str, List[str]] = {}
+            self._replica_keys: set = set()
+            # Версия кольца, при которой получены копии; чтения копий для владельцев
+            self._replica_ring_version = self._cluster.ring.version
+            self._replica_hits: Dict[str, int] = {}
+            self._hit_report_task: Optional[asyncio.Task] = None
+            self._hot_routes: Dict[str, Tuple[float, List[str]]] = {}
+            self._pending_pushes: set = set()
+            self._pending_drops: Dict[str, set] = {}
+            self._replication_task: Optional[asyncio.Task] = None
     
-    def _get_partition(self, key: str) -> int:
-        """Определение партиции для ключа."""
-        return hash(key) % self._partition_count
-    
-    async def _get_node_for_key(self, key: str) -> Optional[str]:
-        """Получение узла для ключа на основе консистентного хэширования."""
-        partition = self._get_partition(key)
-        best_node = await self._cluster.get_best_node()
-        return best_node.id if best_node else None
+    def _get_node_for_key(self, key: str) -> str:
+        """Получение узла-владельца ключа по кольцу консистентного хэширования."""
+        return self._cluster.get_node_id_for_key(key)
     
     async def get(self, key: str) -> Optional[Any]:
-        """Получение значения из распределенного кэша."""
+        """Получение значения из распределенного кэша.
+
+        Чужой ключ ищется по порядку: копия-реплика на этом узле, ближний
+        кэш, случайная реплика горячего ключа, узел-владелец.
+        """
         try:
-            node_id = await self._get_node_for_key(key)
-            if not node_id:
-                return None
+            node_id = self._get_node_for_key(key)
             
             if node_id == self._cluster._node_id:
-                async with self._lock:
-                    if key not in self._cache:
-                        return None
-                    
-                    if time.time() - self._timestamps[key] > self._default_ttl:
-                        del self._cache[key]
-                        del self._timestamps[key]
-                        return None
-                    
-                    return self._cache[key]
+                self._record_access(key)
+                return self._get_local(key)
             else:
-                # Получение значения с другого узла
-                node = self._cluster.nodes.get(node_id)
-                if not node or not node.is_alive:
-                    return None
+                value = self._get_replica(key)
+                if value is not None:
+                    return value
+                if self._near is not None:
+                    value = self._near.get(key)
+                    if value is not None:
+                        return value
                 
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f"http://{node.host}:{node.port}/cache/{key}") as response:
-                        if response.status == 200:
-                            return await response.json()
+                replica_id = self._route_read(key)
+                if replica_id is not None and replica_id != node_id:
+                    payload = await self._fetch(replica_id, key)
+                    if payload is not None:
+                        self._stats["replica_reads"] += 1
+                        value = payload["value"]
+                    else:
+                        self._stats["replica_fallbacks"] += 1
+                
+                if value is None:
+                    # Получение значения с узла-владельца
+                    hits = self._near.take_hits(key) if self._near is not None else 0
+                    payload = await self._fetch(node_id, key, hits)
+                    if payload is None:
                         return None
+                    self._learn_routes([key], payload.get("replicas", {}))
+                    value = payload["value"]
+                if self._near is not None:
+                    self._near.put(key, value)
+                return value
         except Exception as e:
             logging.error(f"Ошибка при получении из кэша: {e}")
             return None
@@ -76,34 +145,20 @@ class CacheManager:
     async def set(self, key: str, value: Any, ttl: int = None) -> bool:
         """Сохранение значения в распределенный кэш."""
         try:
-            node_id = await self._get_node_for_key(key)
-            if not node_id:
-                return False
+            node_id = self._get_node_for_key(key)
             
             if node_id == self._cluster._node_id:
-                async with self._lock:
-                    if self._check_memory_usage():
-                        await self._cleanup_cache()
-                    
-                    self._cache[key] = value
-                    self._timestamps[key] = time.time()
-                    
-                    if len(self._cache) > self._cleanup_threshold:
-                        await self._cleanup_cache()
-                    
-                    return True
+                self.set_many_local({key: value}, ttl)
+                return True
             else:
                 # Сохранение значения на другом узле
                 node = self._cluster.nodes.get(node_id)
                 if not node or not node.is_alive:
                     return False
                 
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        f"http://{node.host}:{node.port}/cache/{key}",
-                        json={"value": value, "ttl": ttl}
-                    ) as response:
-                        return response.status == 200
+                status, _ = await self._request(node, 'POST', f"/cache/{key}", {"value": value, "ttl": ttl})
+                self._forget_remote([key])
+                return status == 200
         except Exception as e:
             logging.error(f"Ошибка при сохранении в кэш: {e}")
             return False
@@ -111,92 +166,751 @@ class CacheManager:
     async def delete(self, key: str) -> bool:
         """Удаление значения из распределенного кэша."""
         try:
-            node_id = await self._get_node_for_key(key)
-            if not node_id:
-                return False
+            node_id = self._get_node_for_key(key)
             
             if node_id == self._cluster._node_id:
-                async with self._lock:
-                    if key in self._cache:
-                        del self._cache[key]
-                        del self._timestamps[key]
-                        return True
-                    return False
+                return self.delete_many_local([key]) > 0
             else:
+                self._forget_remote([key])
+
                 node = self._cluster.nodes.get(node_id)
                 if not node or not node.is_alive:
                     return False
                 
-                async with aiohttp.ClientSession() as session:
-                    async with session.delete(f"http://{node.host}:{node.port}/cache/{key}") as response:
-                        return response.status == 200
+                status, _ = await self._request(node, 'DELETE', f"/cache/{key}")
+                return status == 200
         except Exception as e:
             logging.error(f"Ошибка при удалении из кэша: {e}")
             return False
     
+    def _take_copies(self, groups: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Значения удаленных ключей из реплик на этом узле и ближнего кэша.
+
+        Найденные ключи убираются из groups.
+        """
+        found: Dict[str, Any] = {}
+        if self._near is None and not self._replica_keys:
+            return found
+        for node_id in list(groups):
+            if node_id == self._cluster._node_id:
+                continue
+            missing = []
+            for key in groups[node_id]:
+                value = self._get_replica(key)
+                if value is None and self._near is not None:
+                    value = self._near.get(key)
+                if value is None:
+                    missing.append(key)
+                else:
+                    found[key] = value
+            if missing:
+                groups[node_id] = missing
+            else:
+                del groups[node_id]
+        return found
+    
+    def _group_by_node(self, keys) -> Dict[str, List[str]]:
+        """Группировка ключей по узлам-владельцам."""
+        groups: Dict[str, List[str]] = {}
+        for key in keys:
+            groups.setdefault(self._get_node_for_key(key), []).append(key)
+        return groups
+    
+    def _route_groups(self, groups: Dict[str, List[str]]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """Перенос горячих удаленных ключей из групп владельцев в группы случайных реплик.
+
+        Возвращает новые группы и ключи, отправленные на реплики.
+        """
+        routed: Dict[str, List[str]] = {}
+        via_replica: List[str] = []
+        for node_id, group in groups.items():
+            for key in group:
+                target = node_id
+                if node_id != self._cluster._node_id:
+                    target = self._route_read(key) or node_id
+                    if target != node_id:
+                        via_replica.append(key)
+                routed.setdefault(target, []).append(key)
+        return routed, via_replica
+    
+    async def _fetch(self, node_id: str, key: str, hits: int = 0) -> Optional[Dict[str, Any]]:
+        """Чтение ключа с узла; ответ узла или None, если ключа нет или узел недоступен.
+
+        hits — чтения ключа из ближнего кэша с прошлого запроса (для учета горячих ключей).
+        """
+        node = self._cluster.nodes.get(node_id)
+        if not node or not node.is_alive:
+            return None
+        try:
+            path = f"/cache/{key}?hits={hits}" if hits else f"/cache/{key}"
+            status, payload = await self._request(node, 'GET', path)
+            return payload if status == 200 else None
+        except Exception as e:
+            logging.error(f"Ошибка при чтении ключа с узла {node_id}: {e}")
+            return None
+    
+    async def _request(self, node: NodeInfo, method: str, path: str, payload: Any = None) -> Tuple[int, Any]:
+        """Запрос к API узла в согласованном формате (wire_codec).
+
+        Возвращает статус и декодированное тело успешного ответа. Тело
+        запроса кодируется в формате последнего ответа этого узла, до
+        первого ответа — в JSON.
+        """
+        content_type, compressions = self._peer_formats.get(node.id, (wire_codec.JSON, ()))
+        headers = {
+            'Accept': wire_codec.ACCEPT,
+            wire_codec.ACCEPT_COMPRESSION_HEADER: wire_codec.ACCEPT_COMPRESSION
+        }
+        data = None
+        if payload is not None:
+            data, compression = wire_codec.encode(payload, content_type, compressions)
+            headers['Content-Type'] = content_type
+            if compression:
+                headers[wire_codec.COMPRESSION_HEADER] = compression
+        
+        async with self._http.session.request(
+            method, f"http://{node.host}:{node.port}{path}", data=data, headers=headers
+        ) as response:
+            if response.status != 200:
+                return response.status, None
+            body = await response.read()
+            if response.content_type in wire_codec.SUPPORTED_TYPES:
+                compression = wire_codec.negotiate_compression(
+                    response.headers.get(wire_codec.ACCEPT_COMPRESSION_HEADER)
+                )
+                self._peer_formats[node.id] = (response.content_type, (compression,) if compression else ())
+            return response.status, wire_codec.decode(
+                body, response.content_type, response.headers.get(wire_codec.COMPRESSION_HEADER)
+            )
+    
+    async def _post_batch(self, node_id: str, operation: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Один пакетный запрос к узлу; None — узел недоступен или ошибка."""
+        node = self._cluster.nodes.get(node_id)
+        if not node or not node.is_alive:
+            return None
+        try:
+            status, result = await self._request(node, 'POST', f"/cache/batch/{operation}", payload)
+            return result if status == 200 else None
+        except Exception as e:
+            logging.error(f"Ошибка пакетного запроса {operation} к узлу {node_id}: {e}")
+            return None
+    
+    async def _run_batches(self, groups: Dict[str, Any], local, operation: str,
+                           payload: Callable[[Any], Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Локальная часть выполняется сразу, удаленные узлы — одним запросом каждый, параллельно.
+
+        Результаты возвращаются в порядке groups.
+        """
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        remote = {}
+        for node_id, group in groups.items():
+            if node_id == self._cluster._node_id:
+                results[node_id] = local(group)
+            else:
+                remote[node_id] = group
+        if remote:
+            responses = await asyncio.gather(*(
+                self._post_batch(node_id, operation, payload(group))
+                for node_id, group in remote.items()
+            ))
+            results.update(zip(remote, responses))
+        return [results[node_id] for node_id in groups]
+    
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Получение нескольких значений: один запрос на узел-владелец.
+
+        Возвращает словарь только найденных ключей.
+        """
+        try:
+            groups = self._group_by_node(keys)
+            owners = {key: node_id for node_id, group in groups.items() for key in group}
+            found = self._take_copies(groups)
+            routed, via_replica = self._route_groups(groups)
+            found.update(await self._get_batches(routed, owners))
+            if via_replica:
+                # Ключи, которых не оказалось на репликах, читаются у владельцев
+                missing = [key for key in via_replica if key not in found]
+                self._stats["replica_reads"] += len(via_replica) - len(missing)
+                self._stats["replica_fallbacks"] += len(missing)
+                if missing:
+                    found.update(await self._get_batches(self._group_by_node(missing), owners))
+            return found
+        except Exception as e:
+            logging.error(f"Ошибка при пакетном получении из кэша: {e}")
+            return {}
+    
+    async def _get_batches(self, groups: Dict[str, List[str]], owners: Dict[str, str]) -> Dict[str, Any]:
+        """Пакетное чтение по группам узлов; маршруты к репликам берутся из ответов владельцев."""
+        found: Dict[str, Any] = {}
+        for node_id, result in zip(groups, await self._run_batches(
+            groups, lambda group: {"values": self.get_many_local(group)}, "get",
+            lambda group: {"keys": group, "hits": self._take_near_hits(group)}
+        )):
+            if not result:
+                continue
+            found.update(result["values"])
+            if node_id == self._cluster._node_id:
+                continue
+            if self._near is not None:
+                for key, value in result["values"].items():
+                    self._near.put(key, value)
+            self._learn_routes(
+                [key for key in groups[node_id] if owners[key] == node_id],
+                result.get("replicas", {})
+            )
+        return found
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int = None) -> int:
+        """Сохранение нескольких значений: один запрос на узел-владелец.
+
+        Возвращает число сохраненных ключей.
+        """
+        try:
+            groups = self._group_by_node(items)
+            self._forget_remote(items)
+            stored = 0
+            for result in await self._run_batches(
+                groups, lambda group: {"stored": self.set_many_local({key: items[key] for key in group}, ttl)},
+                "set", lambda group: {"items": {key: items[key] for key in group}, "ttl": ttl}
+            ):
+                if result:
+                    stored += result["stored"]
+            return stored
+        except Exception as e:
+            logging.error(f"Ошибка при пакетном сохранении в кэш: {e}")
+            return 0
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """Удаление нескольких значений: один запрос на узел-владелец.
+
+        Возвращает число удаленных ключей.
+        """
+        try:
+            groups = self._group_by_node(keys)
+            self._forget_remote(keys)
+            deleted = 0
+            for result in await self._run_batches(
+                groups, lambda group: {"deleted": self.delete_many_local(group)}, "delete",
+                lambda group: {"keys": group}
+            ):
+                if result:
+                    deleted += result["deleted"]
+            return deleted
+        except Exception as e:
+            logging.error(f"Ошибка при пакетном удалении из кэша: {e}")
+            return 0
+    
+    def _take_near_hits(self, keys: List[str]) -> Dict[str, int]:
+        """Попадания ближнего кэша по ключам для отправки владельцу."""
+        if self._near is None:
+            return {}
+        hits = {}
+        for key in keys:
+            count = self._near.take_hits(key)
+            if count:
+                hits[key] = count
+        return hits
+    
+    def get_many_local(self, keys: List[str], hits: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Пакетное чтение локального хранилища (для API узла).
+
+        hits — чтения ключей из ближнего кэша запросившего узла.
+        """
+        found = {}
+        for key in keys:
+            count = 1 + hits.get(key, 0) if hits else 1
+            if key in self._replica_keys:
+                value = self._get_replica(key, count)
+            else:
+                self._record_access(key, count)
+                value = self._get_local(key)
+            if value is not None:
+                found[key] = value
+        return found
+    
+    def set_many_local(self, items: Dict[str, Any], ttl: int = None) -> int:
+        """Пакетная запись в локальное хранилище (для API узла)."""
+        if self._pressure.level >= PRESSURE_CRITICAL:
+            self._remove_expired()
+        for key, value in items.items():
+            self._store_local(key, value, ttl)
+        self._broadcast_invalidation(items)
+        self._replicate(items)
+        return len(items)
+    
+    def delete_many_local(self, keys: List[str]) -> int:
+        """Пакетное удаление из локального хранилища (для API узла)."""
+        deleted = sum(self._remove_local(key) for key in keys)
+        self._broadcast_invalidation(keys)
+        self._replicate(keys)
+        return deleted
+    
+    def invalidate_near(self, keys: List[str]) -> int:
+        """Удаление копий из ближнего кэша по сообщению владельца (для API узла)."""
+        if self._near is None:
+            return 0
+        return self._near.invalidate(keys)
+    
+    def _broadcast_invalidation(self, keys) -> None:
+        """Постановка ключей в рассылку инвалидации остальным узлам.
+
+        Ключи, измененные в одном проходе event loop, уходят одним
+        запросом на каждый узел. Рассылка не зависит от ближнего кэша
+        этого узла: он может быть выключен здесь и включен у соседей.
+        """
+        if len(self._cluster.ring) < 2:
+            return
+        self._pending_invalidations.update(keys)
+        if self._invalidation_task is None:
+            self._invalidation_task = asyncio.ensure_future(self._send_invalidations())
+    
+    async def _send_invalidations(self) -> None:
+        await asyncio.sleep(0)
+        keys = list(self._pending_invalidations)
+        self._pending_invalidations.clear()
+        self._invalidation_task = None
+        peers = [
+            node_id for node_id in self._cluster.ring.nodes
+            if node_id != self._cluster._node_id
+        ]
+        self._stats["invalidations_sent"] += len(keys) * len(peers)
+        await asyncio.gather(*(
+            self._post_batch(node_id, "invalidate", {"keys": keys}) for node_id in peers
+        ))
+    
+    async def get_for_peer(self, key: str, hits: int = 0) -> Optional[Any]:
+        """Чтение по запросу другого узла (для API узла).
+
+        Отдает копию-реплику или значение владельца. В отличие от get не
+        читает с реплик, поэтому запрос между узлами не ходит по кругу.
+        hits — чтения ключа из ближнего кэша запросившего узла.
+        """
+        value = self._get_replica(key, 1 + hits)
+        if value is not None:
+            return value
+        node_id = self._get_node_for_key(key)
+        if node_id == self._cluster._node_id:
+            self._record_access(key, 1 + hits)
+            return self._get_local(key)
+        payload = await self._fetch(node_id, key, hits)
+        return payload["value"] if payload is not None else None
+    
+    def replica_routes(self, keys) -> Dict[str, List[str]]:
+        """Узлы с копиями горячих ключей из keys, владелец первым (подсказка читающим узлам)."""
+        node_id = self._cluster._node_id
+        return {key: [node_id] + self._hot_replicas[key] for key in keys if key in self._hot_replicas}
+    
+    def replicate_local(self, items: Dict[str, Any], ttls: Dict[str, float], deleted: List[str]) -> int:
+        """Запись и удаление копий горячих ключей по сообщению владельца (для API узла)."""
+        self._check_replica_ring()
+        changed = 0
+        for key in deleted:
+            if key in self._replica_keys:
+                self._replica_keys.discard(key)
+                self._remove_local(key)
+                changed += 1
+        for key, value in items.items():
+            # Кольцо изменилось и ключ теперь наш: своя запись важнее копии
+            if self._get_node_for_key(key) == self._cluster._node_id:
+                continue
+            self._store_local(key, value, ttls.get(key))
+            self._replica_keys.add(key)
+            changed += 1
+        return changed
+    
+    def _get_replica(self, key: str, count: int = 1) -> Optional[Any]:
+        """Копия чужого горячего ключа на этом узле; count чтений передается владельцу."""
+        if key not in self._replica_keys:
+            return None
+        self._check_replica_ring()
+        if key not in self._replica_keys:
+            return None
+        value = self._get_local(key)
+        if value is None:
+            self._replica_keys.discard(key)
+        else:
+            self._stats["replica_reads"] += 1
+            self._report_hits(key, count)
+        return value
+    
+    def _check_replica_ring(self) -> None:
+        """Сброс всех копий после изменения кольца: владелец или реплики ключа могли смениться.
+
+        Копии горячих ключей владельцы разошлют заново при следующем пересчете.
+        """
+        version = self._cluster.ring.version
+        if version == self._replica_ring_version:
+            return
+        self._replica_ring_version = version
+        for key in self._replica_keys:
+            self._remove_local(key)
+        self._replica_keys.clear()
+        self._replica_hits.clear()
+    
+    def _report_hits(self, key: str, count: int) -> None:
+        """Учет чтений копии для владельца: без них горячий ключ остыл бы у владельца."""
+        self._replica_hits[key] = self._replica_hits.get(key, 0) + count
+        if self._hit_report_task is None:
+            self._hit_report_task = asyncio.ensure_future(self._send_hit_reports())
+    
+    async def _send_hit_reports(self) -> None:
+        """Отправка накопленных чтений копий владельцам: один запрос на узел за полокна."""
+        await asyncio.sleep(CACHE_HOT_KEY_WINDOW / 2)
+        hits, self._replica_hits = self._replica_hits, {}
+        self._hit_report_task = None
+        groups: Dict[str, Dict[str, int]] = {}
+        for key, count in hits.items():
+            groups.setdefault(self._get_node_for_key(key), {})[key] = count
+        local = groups.pop(self._cluster._node_id, None)
+        if local:
+            self.record_hits(local)
+        await asyncio.gather(*(
+            self._post_batch(node_id, "hits", {"hits": group}) for node_id, group in groups.items()
+        ))
+    
+    def record_hits(self, hits: Dict[str, int]) -> int:
+        """Учет чтений своих ключей, обслуженных репликами (для API узла)."""
+        recorded = 0
+        for key, count in hits.items():
+            if self._get_node_for_key(key) == self._cluster._node_id:
+                self._record_access(key, count)
+                recorded += 1
+        return recorded
+    
+    def _route_read(self, key: str) -> Optional[str]:
+        """Случайный узел с копией горячего ключа; None, если маршрута нет."""
+        route = self._hot_routes.get(key)
+        if route is None:
+            return None
+        expires_at, nodes = route
+        if expires_at <= time.monotonic():
+            del self._hot_routes[key]
+            return None
+        return random.choice(nodes)
+    
+    def _learn_routes(self, keys: List[str], routes: Dict[str, List[str]]) -> None:
+        """Запоминание узлов с копиями по ответу владельца; ключи без копий забываются."""
+        expires_at = time.monotonic() + self._replica_lease
+        for key in keys:
+            nodes = [node_id for node_id in routes.get(key, ()) if node_id != self._cluster._node_id]
+            if nodes:
+                self._hot_routes[key] = (expires_at, nodes)
+            else:
+                self._hot_routes.pop(key, None)
+    
+    def _forget_remote(self, keys) -> None:
+        """Сброс копий чужих ключей перед записью: ближний кэш, реплика и маршрут.
+
+        Следующее чтение этого узла идет к владельцу и видит записанное
+        значение, даже если рассылка владельца репликам еще не дошла.
+        """
+        if self._near is not None:
+            self._near.invalidate(keys)
+        for key in keys:
+            if key in self._replica_keys:
+                self._replica_keys.discard(key)
+                self._remove_local(key)
+            self._hot_routes.pop(key, None)
+    
+    def _record_access(self, key: str, count: int = 1) -> None:
+        """Учет чтений своего ключа; по окончании окна пересчитываются горячие ключи.
+
+        Без кластера реплицировать некуда, и локальное чтение обходится
+        без счетчиков.
+        """
+        if self._hot_keys is None or len(self._cluster.ring) < 2:
+            return
+        if self._hot_keys.record(key, count):
+            self._rotate_hot_keys()
+    
+    def _rotate_hot_keys(self) -> None:
+        """Пересчет горячих ключей по закрывшемуся окну и продление копий.
+
+        Реплики горячего ключа — следующие за владельцем узлы кольца
+        (HashRing.get_nodes). Репликам остывших ключей и узлам, которые
+        перестали быть репликами после изменения кольца, рассылается
+        удаление копий.
+        """
+        hot, cooled = self._hot_keys.rotate()
+        for key in cooled:
+            self._drop_replicas(key, self._hot_replicas.pop(key, ()))
+        for key in hot:
+            nodes = self._cluster.ring.get_nodes(key, self._replica_count)
+            previous = self._hot_replicas.pop(key, [])
+            if nodes and nodes[0] == self._cluster._node_id and len(nodes) > 1:
+                self._hot_replicas[key] = nodes[1:]
+            self._drop_replicas(key, [
+                node_id for node_id in previous if node_id not in self._hot_replicas.get(key, ())
+            ])
+        self._replicate(self._hot_replicas)
+    
+    def _replicate(self, keys) -> None:
+        """Постановка горячих ключей в рассылку текущих значений их репликам."""
+        if not self._hot_replicas:
+            return
+        self._pending_pushes.update(key for key in keys if key in self._hot_replicas)
+        self._schedule_replication()
+    
+    def _drop_replicas(self, key: str, nodes) -> None:
+        """Постановка в рассылку удаления копии ключа на узлах nodes."""
+        for node_id in nodes:
+            self._pending_drops.setdefault(node_id, set()).add(key)
+        if nodes:
+            self._schedule_replication()
+    
+    def _schedule_replication(self) -> None:
+        if self._replication_task is None and (self._pending_pushes or self._pending_drops):
+            self._replication_task = asyncio.ensure_future(self._send_replication())
+    
+    async def _send_replication(self) -> None:
+        """Рассылка копий: изменения за один проход event loop — один запрос на узел.
+
+        Копия живет не дольше lease и не дольше оригинала; отсутствующий
+        у владельца ключ удаляется и на репликах.
+        """
+        await asyncio.sleep(0)
+        pushes, drops = self._pending_pushes, self._pending_drops
+        self._pending_pushes, self._pending_drops = set(), {}
+        self._replication_task = None
+        
+        batches: Dict[str, Dict[str, Any]] = {}
+        current_time = time.monotonic()
+        for key in pushes:
+            value = self._cache.get(key, _MISSING)
+            ttl = min(self._replica_lease, self._expires[key] - current_time) if value is not _MISSING else 0
+            for node_id in self._hot_replicas.get(key, ()):
+                batch = batches.setdefault(node_id, {"items": {}, "ttls": {}, "deleted": []})
+                if ttl > 0:
+                    batch["items"][key] = value
+                    batch["ttls"][key] = ttl
+                else:
+                    batch["deleted"].append(key)
+        for node_id, keys in drops.items():
+            batches.setdefault(node_id, {"items": {}, "ttls": {}, "deleted": []})["deleted"].extend(keys)
+        
+        self._stats["replications_sent"] += sum(
+            len(batch["items"]) + len(batch["deleted"]) for batch in batches.values()
+        )
+        await asyncio.gather(*(
+            self._post_batch(node_id, "replicate", batch) for node_id, batch in batches.items()
+        ))
+    
+    def get_replication_stats(self) -> Dict[str, Any]:
+        """Состояние репликации горячих ключей на этом узле."""
+        current_time = time.monotonic()
+        return {
+            "enabled": self._hot_keys is not None,
+            "replicas": self._replica_count,
+            "lease": self._replica_lease,
+            "hot_keys": self.replica_routes(self._hot_replicas),
+            "replica_keys": sorted(self._replica_keys.intersection(self._cache)),
+            "routes": {
+                key: nodes for key, (expires_at, nodes) in self._hot_routes.items()
+                if expires_at > current_time
+            },
+            "replica_reads": self._stats["replica_reads"],
+            "replica_fallbacks": self._stats["replica_fallbacks"],
+            "replications_sent": self._stats["replications_sent"]
+        }
+    
     async def clear(self) -> None:
         """Полная очистка кэша."""
-        async with self._lock:
-            self._cache.clear()
-            self._timestamps.clear()
-            gc.collect()  # Принудительный сбор мусора
+        if self._near is not None:
+            self._near.clear()
+        for key, nodes in self._hot_replicas.items():
+            self._drop_replicas(key, nodes)
+        self._hot_replicas.clear()
+        if self._hot_keys is not None:
+            self._hot_keys.clear()
+        self._replica_keys.clear()
+        self._replica_hits.clear()
+        self._hot_routes.clear()
+        self._cache.clear()
+        self._expires.clear()
+        self._expiry_heap.clear()
+        self._sizes.clear()
+        self._total_bytes = 0
+        gc.collect()  # Принудительный сбор мусора
+    
+    def _get_local(self, key: str) -> Optional[Any]:
+        """Чтение из локального хранилища с учетом срока жизни."""
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            self._stats["misses"] += 1
+            return None
+        
+        if self._expires[key] <= time.monotonic():
+            self._remove_local(key)
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+        
+        self._cache.move_to_end(key)
+        self._stats["hits"] += 1
+        return value
+    
+    def _store_local(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """Запись в локальное хранилище с вытеснением по LRU."""
+        self._remove_local(key)
+        size = estimate_size(key) + estimate_size(value)
+        expires_at = time.monotonic() + (ttl if ttl and ttl > 0 else self._default_ttl)
+        self._cache[key] = value
+        self._expires[key] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        if len(self._expiry_heap) > 2 * len(self._cache) + 64:
+            self._rebuild_expiry_heap()
+        self._sizes[key] = size
+        self._total_bytes += size
+        self._evict()
+    
+    def _remove_local(self, key: str) -> bool:
+        """Удаление записи из локального хранилища."""
+        if key not in self._cache:
+            return False
+        del self._cache[key]
+        del self._expires[key]
+        self._total_bytes -= self._sizes.pop(key)
+        return True
     
-    def _check_memory_usage(self) -> bool:
-        """Проверка использования памяти."""
-        memory = psutil.Process().memory_percent()
-        return memory > self._max_memory_percent
+    def _evict(self) -> None:
+        """Вытеснение давно не использованных записей сверх лимитов.
+
+        Последняя запись не вытесняется, даже если одна превышает лимит
+        по байтам: иначе только что сохраненное значение сразу пропало бы.
+        """
+        factor = self._pressure.budget_factor
+        max_entries = max(int(self._max_entries * factor), 1)
+        max_bytes = int(self._max_bytes * factor)
+        while len(self._cache) > 1 and (
+            len(self._cache) > max_entries or self._total_bytes > max_bytes
+        ):
+            key = next(iter(self._cache))
+            self._stats["evicted_bytes"] += self._sizes[key]
+            self._stats["evictions"] += 1
+            self._remove_local(key)
+    
+    def _on_memory_pressure(self, level: int) -> None:
+        """Сжатие кэша до уменьшенного бюджета при смене уровня давления."""
+        if level >= PRESSURE_CRITICAL:
+            self._remove_expired()
+        self._evict()
+    
+    def _rebuild_expiry_heap(self) -> None:
+        """Перестроение кучи без устаревших пар; амортизированно O(1) на запись."""
+        self._expiry_heap = [(expires_at, key) for key, expires_at in self._expires.items()]
+        heapq.heapify(self._expiry_heap)
+    
+    def _remove_expired(self) -> int:
+        """Удаление истекших записей.
+
+        Снимает с кучи только пары, срок которых наступил, поэтому стоимость
+        пропорциональна числу истекших записей, а не размеру кэша.
+        """
+        current_time = time.monotonic()
+        heap = self._expiry_heap
+        removed = 0
+        while heap and heap[0][0] <= current_time:
+            expires_at, key = heapq.heappop(heap)
+            # Пара устарела, если ключ удален, вытеснен или перезаписан
+            if self._expires.get(key) == expires_at:
+                self._remove_local(key)
+                removed += 1
+        self._stats["expirations"] += removed
+        return removed
     
     async def _cleanup_cache(self) -> None:
         """Очистка устаревших записей."""
-        current_time = time.time()
-        keys_to_delete = [
-            key for key, timestamp in self._timestamps.items()
-            if current_time - timestamp > self._default_ttl
-        ]
-        
-        for key in keys_to_delete:
-            await self.delete(key)
+        removed = self._remove_expired()
+        # Копии, вытесненные или истекшие локально, и устаревшие маршруты
+        self._replica_keys.intersection_update(self._cache)
+        current_time = time.monotonic()
+        self._hot_routes = {
+            key: route for key, route in self._hot_routes.items() if route[0] > current_time
+        }
         
-        if keys_to_delete:
+        if removed:
             gc.collect()
     
     async def _periodic_cleanup(self) -> None:
         """Периодическая очистка кэша."""
         while True:
-            await asyncio.sleep(300)  # Проверка каждые 5 минут
+            await asyncio.sleep(60)  # Очистка снимает с кучи только истекшие записи
             await self._cleanup_cache()
     
     def get_stats(self) -> Dict[str, Any]:
         """Получение статистики кэша."""
         return {
             "total_items": len(self._cache),
-            "memory_usage": psutil.Process().memory_percent(),
-            "cache_age": {
-                key: time.time() - timestamp
-                for key, timestamp in self._timestamps.items()
+            "total_bytes": self._total_bytes,
+            "max_entries": self._max_entries,
+            "max_bytes": self._max_bytes,
+            **self._stats,
+            "budget_factor": self._pressure.budget_factor,
+            "memory_pressure": self._pressure.level,
+            "near_cache": self._near.get_stats() if self._near is not None else None,
+            "expires_in": {
+                key: expires_at - time.monotonic()
+                for key, expires_at in self._expires.items()
             }
         }
     
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]],
+                          ttl: int = None) -> Optional[Any]:
+        """Чтение из кэша с загрузкой при промахе (single-flight).
+
+        Одновременные промахи по одному ключу ждут одну общую загрузку:
+        loader вызывается один раз, результат (если не None) сохраняется
+        в кэш с ttl и возвращается всем ожидающим. Загрузка защищена
+        от отмены отдельного вызывающего, поэтому отмена одного обработчика
+        не обрывает ее для остальных.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl))
+            self._inflight[key] = task
+        else:
+            self._stats["loads_deduplicated"] += 1
+        return await asyncio.shield(task)
+    
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[int]) -> Optional[Any]:
+        try:
+            self._stats["loads"] += 1
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+    
     async def prefetch(self, keys: list, fetch_func) -> None:
-        """Предварительная загрузка данных в кэш."""
-        for key in keys:
-            if not await self.get(key):
-                value = await fetch_func(key)
-                if value:
-                    await self.set(key, value)
+        """Предварительная загрузка данных в кэш.
+
+        Уже закэшированные ключи читаются одним запросом на узел,
+        недостающие загружаются параллельно и сохраняются так же пакетно.
+        """
+        cached = await self.get_many(keys)
+        missing = [key for key in keys if not cached.get(key)]
+        values = await asyncio.gather(*(fetch_func(key) for key in missing))
+        await self.set_many({key: value for key, value in zip(missing, values) if value})
     
-    def set_max_memory_percent(self, percent: int) -> None:
-        """Установка максимального процента использования памяти."""
-        if 0 < percent < 100:
-            self._max_memory_percent = percent
+    def set_max_entries(self, max_entries: int) -> None:
+        """Установка лимита на число локальных записей."""
+        if max_entries > 0:
+            self._max_entries = max_entries
+            self._evict()
     
-    def set_cleanup_threshold(self, threshold: int) -> None:
-        """Установка порога для очистки кэша."""
-        if threshold > 0:
-            self._cleanup_threshold = threshold
+    def set_max_bytes(self, max_bytes: int) -> None:
+        """Установка лимита на оценку занимаемой локальными записями памяти."""
+        if max_bytes > 0:
+            self._max_bytes = max_bytes
+            self._evict()
     
     def set_default_ttl(self, ttl: int) -> None:
-        """Установка времени жизни кэша по умолчанию."""
+        """Установка времени жизни по умолчанию для записей, сохраняемых без ttl."""
         if ttl > 0:
             self._default_ttl = ttl 
     
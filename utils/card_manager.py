@@ -36,6 +36,8 @@ class CardManager:
                 deck_data = json.load(f)
                 self.cards = []
                 self.card_names = []
+                # Записи карт сохраняются в кэш одним пакетом
+                cache_entries = {}
                 
                 # Загружаем Старшие арканы
                 for ru_name, card_data in deck_data["Старшие арканы"].items():
@@ -68,8 +70,7 @@ class CardManager:
                     card_data['ru'] = ru_name
                     self.cards.append(card_data)
                     self.card_names.append(en_name)
-                    # Кэшируем карту
-                    await self.cache.set(f"card_{en_name}", card_data)
+                    cache_entries[f"card_{en_name}"] = card_data
                 
                 # Загружаем Младшие арканы
                 for suit, cards in deck_data["Младшие арканы"].items():
@@ -109,12 +110,12 @@ class CardManager:
                         card_data['ru'] = ru_name
                         self.cards.append(card_data)
                         self.card_names.append(en_name)
-                        # Кэшируем карту
-                        await self.cache.set(f"card_{en_name}", card_data)
+                        cache_entries[f"card_{en_name}"] = card_data
                 
-                # Кэшируем список всех карт
-                await self.cache.set("all_cards", self.cards)
-                await self.cache.set("card_names", self.card_names)
+                # Кэшируем карты и списки всех карт: один запрос на узел кластера
+                cache_entries["all_cards"] = self.cards
+                cache_entries["card_names"] = self.card_names
+                await self.cache.set_many(cache_entries)
                 
                 logging.info(f"Загружено {len(self.cards)} карт")
                 
@@ -129,25 +130,15 @@ class CardManager:
 
     async def get_card_info(self, name_en: str) -> Optional[Dict]:
         """Получение информации о карте."""
-        # Пробуем получить из кэша
-        cache_key = f"card_{name_en}"
-        card_info = await self.cache.get(cache_key)
-        if card_info:
-            return card_info
+        # Одновременные промахи кэша по карте делят одну загрузку
+        return await self.cache.get_or_load(f"card_{name_en}", lambda: self._load_card_info(name_en))
 
-        # Если нет в кэше, ищем в локальном списке
+    async def _load_card_info(self, name_en: str) -> Optional[Dict]:
+        """Поиск карты в локальном списке, затем в базе данных."""
         for card in self.cards:
             if card['en'] == name_en:
-                # Сохраняем в кэш
-                await self.cache.set(cache_key, card)
                 return card
-
-        # Если не нашли, ищем в базе данных
-        card_info = await self.db.get_card(name_en)
-        if card_info:
-            # Сохраняем в кэш
-            await self.cache.set(cache_key, card_info)
-        return card_info
+        return await self.db.get_card(name_en)
 
     def generate_spread(self) -> List[str]:
         """Генерация расклада из трех случайных карт."""
@@ -159,7 +150,8 @@ class CardManager:
         """Сохранение расклада в базу данных."""
         try:
             async with self._lock:
-                await self.db.save_spread(int(user_id), theme, json.dumps(cards))
+                # Запись уходит в очередь группового коммита
+                self.db.enqueue_spread(int(user_id), theme, json.dumps(cards))
                 # Кэшируем последний расклад пользователя
                 await self.cache.set(f"last_spread_{user_id}", {
                     "theme": theme,
@@ -174,18 +166,10 @@ class CardManager:
     async def get_saved_spread(self, user_id: str) -> Optional[Dict]:
         """Получение последнего сохраненного расклада пользователя."""
         try:
-            # Пробуем получить из кэша
-            cache_key = f"last_spread_{user_id}"
-            spread = await self.cache.get(cache_key)
-            if spread:
-                return spread
-
-            # Если нет в кэше, получаем из базы
-            spread = await self.db.get_last_spread(int(user_id))
-            if spread:
-                # Сохраняем в кэш
-                await self.cache.set(cache_key, spread)
-            return spread
+            # Одновременные промахи кэша делят один запрос к базе
+            return await self.cache.get_or_load(
+                f"last_spread_{user_id}", lambda: self.db.get_last_spread(int(user_id))
+            )
         except Exception as e:
             logging.error(f"Ошибка при получении сохраненного расклада: {e}")
             return None
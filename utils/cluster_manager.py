@@ -2,10 +2,12 @@ import asyncio
 import logging
 from typing import Dict, List, Optional
 import json
-import aiohttp
 from dataclasses import dataclass
 import psutil
 import time
+from config import CLUSTER_VNODES
+from .hash_ring import HashRing
+from .http_client import HttpClient
 
 @dataclass
 class NodeInfo:
@@ -39,6 +41,8 @@ class ClusterManager:
             self._initialized = True
             self._cleanup_task = None
             self._heartbeat_task = None
+            # Размещение ключей кэша: живые узлы на кольце консистентного хэширования
+            self.ring = HashRing(CLUSTER_VNODES)
 
     async def start(self, host: str, port: int, master: bool = True):
         """Запуск узла кластера."""
@@ -64,17 +68,16 @@ class ClusterManager:
         master_port = 8000
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"http://{master_host}:{master_port}/node/register",
-                    json={
-                        "node_id": self._node_id,
-                        "host": self._host,
-                        "port": self._port
-                    }
-                ) as response:
-                    if response.status != 200:
-                        logging.error("Не удалось зарегистрироваться у мастер-узла")
+            async with HttpClient().session.post(
+                f"http://{master_host}:{master_port}/node/register",
+                json={
+                    "node_id": self._node_id,
+                    "host": self._host,
+                    "port": self._port
+                }
+            ) as response:
+                if response.status != 200:
+                    logging.error("Не удалось зарегистрироваться у мастер-узла")
         except Exception as e:
             logging.error(f"Ошибка при регистрации у мастер-узла: {e}")
 
@@ -90,17 +93,42 @@ class ClusterManager:
                     memory_usage=psutil.virtual_memory().percent,
                     last_heartbeat=time.time()
                 )
+                self.ring.add(node_id)
                 logging.info(f"Зарегистрирован новый узел: {node_id}")
                 return True
             return False
 
     async def get_best_node(self) -> Optional[NodeInfo]:
         """Получение узла с наименьшей нагрузкой."""
+        # Только чтение без await: блокировка не нужна в однопоточном event loop
+        available_nodes = [node for node in self.nodes.values() if node.is_alive]
+        if not available_nodes:
+            return None
+        return min(available_nodes, key=lambda x: (x.load, x.memory_usage))
+
+    def get_node_id_for_key(self, key: str) -> str:
+        """Узел-владелец ключа кэша по кольцу консистентного хэширования.
+
+        Владелец одинаков во всех процессах и не зависит от нагрузки
+        узлов. Пока кластер не запущен, кольцо пусто и владельцем
+        считается сам процесс.
+        """
+        return self.ring.get(key) or self._node_id
+
+    async def update_heartbeat(self, node_id: str, load: float, memory_usage: float) -> bool:
+        """Обновление heartbeat узла; узел, помеченный неактивным, возвращается на кольцо."""
         async with self._lock:
-            available_nodes = [node for node in self.nodes.values() if node.is_alive]
-            if not available_nodes:
-                return None
-            return min(available_nodes, key=lambda x: (x.load, x.memory_usage))
+            node = self.nodes.get(node_id)
+            if node is None:
+                return False
+            node.load = load
+            node.memory_usage = memory_usage
+            node.last_heartbeat = time.time()
+            if not node.is_alive:
+                node.is_alive = True
+                self.ring.add(node_id)
+                logging.info(f"Узел {node_id} снова активен")
+            return True
 
     async def _send_heartbeat(self):
         """Отправка сигнала активности."""
@@ -120,16 +148,15 @@ class ClusterManager:
                 # Отправляем heartbeat другим узлам
                 if not self._master_node:
                     try:
-                        async with aiohttp.ClientSession() as session:
-                            async with session.post(
-                                f"http://localhost:8000/node/heartbeat/{self._node_id}",
-                                json={
-                                    "load": current_load,
-                                    "memory_usage": memory_usage
-                                }
-                            ) as response:
-                                if response.status != 200:
-                                    logging.warning("Не удалось отправить heartbeat")
+                        async with HttpClient().session.post(
+                            f"http://localhost:8000/node/heartbeat/{self._node_id}",
+                            json={
+                                "load": current_load,
+                                "memory_usage": memory_usage
+                            }
+                        ) as response:
+                            if response.status != 200:
+                                logging.warning("Не удалось отправить heartbeat")
                     except Exception as e:
                         logging.error(f"Ошибка при отправке heartbeat: {e}")
                 
@@ -151,6 +178,8 @@ class ClusterManager:
                     for node_id in dead_nodes:
                         if node_id != self._node_id:  # Не помечаем себя как мертвый узел
                             self.nodes[node_id].is_alive = False
+                            # Ключи узла переходят к соседям по кольцу (~1/N всех ключей)
+                            self.ring.remove(node_id)
                             logging.warning(f"Узел {node_id} помечен как неактивный")
                 
                 await asyncio.sleep(self._node_timeout)
@@ -163,6 +192,7 @@ class ClusterManager:
         return {
             "total_nodes": len(self.nodes),
             "active_nodes": len([n for n in self.nodes.values() if n.is_alive]),
+            "ring_nodes": self.ring.nodes,
             "average_load": sum(n.load for n in self.nodes.values()) / len(self.nodes) if self.nodes else 0,
             "nodes": [
                 {
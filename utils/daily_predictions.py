@@ -18,76 +18,77 @@ class DailyPredictionManager:
         self.image_manager = ImageManager()
         self.is_running = False
     
-    async def send_daily_predictions(self):
-        subscribers = self.user_manager.get_daily_prediction_subscribers()
-        logging.info(f"Отправка дневных предсказаний {len(subscribers)} подписчикам")
+    async def send_daily_predictions(self, after_id: int = 0):
+        logging.info("Отправка дневных предсказаний подписчикам")
         
-        for user_id in subscribers:
-            try:
-                user = self.user_manager.get_user(user_id)
-                card = self.card_manager.get_random_card()
+        # Подписчики читаются пачками по user_id, полный список в памяти не держим
+        async for subscribers in self.user_manager.iter_daily_prediction_subscribers(after_id=after_id):
+            for user_id in subscribers:
+                try:
+                    user = await self.user_manager.get_user(user_id)
+                    card = await self.card_manager.get_random_card()
                 
-                message_text = (
-                    "🌟 Ваше предсказание на сегодня:\n\n"
-                    f"🎴 *{card['ru']}*\n\n"
-                    f"✨ {card['Карта на сегодня']}\n\n"
-                    "Хорошего вам дня! ✨"
-                )
+                    message_text = (
+                        "🌟 Ваше предсказание на сегодня:\n\n"
+                        f"🎴 *{card['ru']}*\n\n"
+                        f"✨ {card['Карта на сегодня']}\n\n"
+                        "Хорошего вам дня! ✨"
+                    )
                 
-                # Сохраняем старый ID сообщения
-                old_message_id = None
-                if str(user_id) in last_messages and "bot" in last_messages[str(user_id)]:
-                    old_message_id = last_messages[str(user_id)]["bot"]
+                    # Сохраняем старый ID сообщения
+                    old_message_id = None
+                    if str(user_id) in last_messages and "bot" in last_messages[str(user_id)]:
+                        old_message_id = last_messages[str(user_id)]["bot"]
                 
-                # Отправляем новое сообщение
-                if user["show_images"]:
-                    try:
-                        # Получаем оптимизированное изображение через ImageManager
-                        image_bytes = await self.image_manager.get_image(card['en'])
-                        if image_bytes:
-                            photo = BytesIO(image_bytes)
-                            photo.name = f"{card['en']}.jpg"
-                            new_message = await self.bot.send_photo(
-                                user_id,
-                                photo=photo,
-                                caption=message_text,
-                                parse_mode="Markdown"
-                            )
-                        else:
+                    # Отправляем новое сообщение
+                    if user["show_images"]:
+                        try:
+                            # Получаем оптимизированное изображение через ImageManager
+                            image_bytes = await self.image_manager.get_image(card['en'])
+                            if image_bytes:
+                                photo = BytesIO(image_bytes)
+                                photo.name = f"{card['en']}.jpg"
+                                new_message = await self.bot.send_photo(
+                                    user_id,
+                                    photo=photo,
+                                    caption=message_text,
+                                    parse_mode="Markdown"
+                                )
+                            else:
+                                new_message = await self.bot.send_message(
+                                    user_id,
+                                    message_text + "\n\n⚠️ _Изображение карты временно недоступно_",
+                                    parse_mode="Markdown"
+                                )
+                        except Exception as e:
+                            logging.error(f"Ошибка при отправке изображения: {e}")
                             new_message = await self.bot.send_message(
                                 user_id,
-                                message_text + "\n\n⚠️ _Изображение карты временно недоступно_",
+                                message_text,
                                 parse_mode="Markdown"
                             )
-                    except Exception as e:
-                        logging.error(f"Ошибка при отправке изображения: {e}")
+                    else:
                         new_message = await self.bot.send_message(
                             user_id,
                             message_text,
                             parse_mode="Markdown"
                         )
-                else:
-                    new_message = await self.bot.send_message(
-                        user_id,
-                        message_text,
-                        parse_mode="Markdown"
-                    )
                 
-                # Сохраняем ID нового сообщения
-                last_messages[str(user_id)] = {"bot": new_message.message_id}
+                    # Сохраняем ID нового сообщения
+                    last_messages[str(user_id)] = {"bot": new_message.message_id}
                 
-                # Удаляем старое сообщение после отправки нового
-                if old_message_id:
-                    try:
-                        await self.bot.delete_message(user_id, old_message_id)
-                    except Exception as e:
-                        logging.warning(f"Не удалось удалить старое сообщение: {e}")
+                    # Удаляем старое сообщение после отправки нового
+                    if old_message_id:
+                        try:
+                            await self.bot.delete_message(user_id, old_message_id)
+                        except Exception as e:
+                            logging.warning(f"Не удалось удалить старое сообщение: {e}")
                     
-                await asyncio.sleep(0.5)  # Небольшая задержка между отправками
+                    await asyncio.sleep(0.5)  # Небольшая задержка между отправками
                     
-            except Exception as e:
-                logging.error(f"Ошибка при отправке дневного предсказания пользователю {user_id}: {e}")
-                continue
+                except Exception as e:
+                    logging.error(f"Ошибка при отправке дневного предсказания пользователю {user_id}: {e}")
+                    continue
     
     async def schedule_daily_predictions(self):
         if self.is_running:
@@ -1,9 +1,72 @@
 import sqlite3
+import asyncio
+import heapq
 import json
 import logging
-import asyncio
-from typing import Optional, Dict, List, Any
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional, Dict, List, Any, Iterable, Tuple, AsyncIterator, Callable, Awaitable
 from pathlib import Path
+from collections import deque
+from config import DB_FLUSH_INTERVAL_MS, DB_FLUSH_MAX_ROWS, DB_SHARDS, DB_IMPORT_BATCH, DB_PRAGMA_PROFILE
+from .db_shards import DatabaseShard, shard_index, shard_paths
+from .spread_codec import SpreadCodec
+from .json_stream import iter_json_object
+from . import db_statements as sql
+
+# Версия схемы (PRAGMA user_version): 1 — компактное хранение раскладов
+SCHEMA_VERSION = 1
+
+# Размер пачки при переписывании старых раскладов в компактный формат
+SPREADS_MIGRATION_BATCH = 1000
+
+# Значения по умолчанию для пользователя, которого ещё нет в таблице users
+DEFAULT_USER = {
+    'spreads_today': 0,
+    'last_spread_date': None,
+    'theme': 'light',
+    'show_images': True,
+    'daily_prediction': False
+}
+
+# Колонки users, которые разрешено менять через update_user
+USER_COLUMNS = frozenset(DEFAULT_USER)
+
+def _user_dict(row: tuple) -> Dict[str, Any]:
+    """Строка sql.GET_USER / sql.RESERVE_SPREAD в словарь с булевыми флагами."""
+    return {
+        'user_id': row[0],
+        'spreads_today': row[1],
+        'last_spread_date': row[2],
+        'theme': row[3],
+        'show_images': bool(row[4]),
+        'daily_prediction': bool(row[5])
+    }
+
+def _spread_dict(row: tuple) -> Dict[str, Any]:
+    """(theme, cards, created_at) в прежний формат словаря расклада."""
+    return {'theme': row[0], 'cards': row[1], 'created_at': row[2]}
+
+def _format_timestamp(timestamp: int) -> str:
+    """Секунды Unix в формат CURRENT_TIMESTAMP ('YYYY-MM-DD HH:MM:SS', UTC)."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _check_user_columns(fields: Dict[str, Any]) -> None:
+    """Проверка имён колонок по белому списку перед подстановкой в SQL."""
+    unknown = set(fields) - USER_COLUMNS
+    if unknown:
+        raise ValueError(f"Недопустимые колонки users: {', '.join(sorted(unknown))}")
+
+@lru_cache(maxsize=64)
+def _upsert_users_sql(columns: tuple) -> str:
+    """UPSERT пользователя для заданного набора колонок."""
+    return f"""
+        INSERT INTO users (user_id, {', '.join(columns)})
+        VALUES (?{', ?' * len(columns)})
+        ON CONFLICT(user_id) DO UPDATE SET
+            {', '.join(f'{column} = excluded.{column}' for column in columns)}
+    """
 
 class Database:
     _instance = None
@@ -16,430 +79,1160 @@ class Database:
 
     def __init__(self):
         if not self._initialized:
-            self._lock = asyncio.Lock()
             self.db_path = Path('data/tarot.db')
             self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self.shard_paths = shard_paths(self.db_path, DB_SHARDS)
+            self._check_shard_files()
+            # Пользователи и расклады распределены по шардам по user_id;
+            # карты хранятся в первом шарде (без шардирования он единственный)
+            self._shards = [
+                DatabaseShard(
+                    index,
+                    path,
+                    self._apply_write_batch,
+                    flush_interval=DB_FLUSH_INTERVAL_MS / 1000,
+                    max_batch=DB_FLUSH_MAX_ROWS,
+                    profile=DB_PRAGMA_PROFILE
+                )
+                for index, path in enumerate(self.shard_paths)
+            ]
+            self._main = self._shards[0]
             self._initialize_database()
             self._initialized = True
 
+    def _check_shard_files(self):
+        """Защита от запуска с DB_SHARDS без разбиения существующей базы."""
+        if len(self.shard_paths) > 1 and self.db_path.exists() and not self.shard_paths[0].exists():
+            raise RuntimeError(
+                f"Включено шардирование (DB_SHARDS={len(self.shard_paths)}), но шарды не созданы. "
+                f"Разбейте {self.db_path} командой: python -m utils.db_split --shards {len(self.shard_paths)}"
+            )
+
+    def _shard(self, user_id: int) -> DatabaseShard:
+        """Шард, в котором хранятся данные пользователя."""
+        return self._shards[shard_index(user_id, len(self._shards))]
+
     def _initialize_database(self):
         """Инициализация базы данных и создание таблиц."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Создаем таблицу пользователей
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id INTEGER PRIMARY KEY,
-                        spreads_today INTEGER DEFAULT 0,
-                        last_spread_date TEXT,
-                        theme TEXT DEFAULT 'light',
-                        show_images BOOLEAN DEFAULT TRUE,
-                        daily_prediction BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Создаем таблицу карт
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS cards (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name_en TEXT NOT NULL,
-                        name_ru TEXT NOT NULL,
-                        meaning TEXT,
-                        history TEXT,
-                        finances TEXT,
-                        relationships TEXT,
-                        career TEXT,
-                        daily TEXT,
-                        weekly TEXT,
-                        monthly TEXT,
-                        hint TEXT,
-                        UNIQUE(name_en)
-                    )
-                ''')
-                
-                # Создаем таблицу раскладов
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS spreads (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        theme TEXT NOT NULL,
-                        cards TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id)
-                    )
-                ''')
-                
-                # Создаем индексы
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_daily_prediction ON users(daily_prediction)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_spreads_user_date ON spreads(user_id, created_at)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_cards_names ON cards(name_en, name_ru)')
-                
-                conn.commit()
-                logging.info("База данных успешно инициализирована")
-                
+            for shard in self._shards:
+                legacy_spreads = shard.pool.write_sync(self._create_schema)
+                if legacy_spreads:
+                    self._migrate_spreads_compact(shard)
+            logging.info(f"База данных успешно инициализирована (шардов: {len(self._shards)})")
         except Exception as e:
             logging.error(f"Ошибка при инициализации базы данных: {e}")
             raise
 
-    async def migrate_data(self):
-        """Миграция данных из JSON файлов в SQLite."""
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        """Создание таблиц и индексов."""
+        cursor = conn.cursor()
+
+        # Действует только для нового файла (ConnectionPool задаёт его ещё до WAL):
+        # освободившиеся страницы возвращаются порциями через incremental_vacuum
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        
+        # Создаем таблицу пользователей
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                spreads_today INTEGER DEFAULT 0,
+                last_spread_date TEXT,
+                theme TEXT DEFAULT 'light',
+                show_images BOOLEAN DEFAULT TRUE,
+                daily_prediction BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Создаем таблицу карт
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name_en TEXT NOT NULL,
+                name_ru TEXT NOT NULL,
+                meaning TEXT,
+                history TEXT,
+                finances TEXT,
+                relationships TEXT,
+                career TEXT,
+                daily TEXT,
+                weekly TEXT,
+                monthly TEXT,
+                hint TEXT,
+                UNIQUE(name_en)
+            )
+        ''')
+        
+        # Словари кодов карт и тем
+        SpreadCodec.create_tables(conn)
+
+        # Старая схема хранит расклады текстом: переписываем их пачками
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'spreads'")
+        legacy_spreads = version < SCHEMA_VERSION and cursor.fetchone() is not None
+
+        # Создаем таблицу раскладов: тема — код из theme_dict,
+        # карты — BLOB по байту на карту из card_dict,
+        # время — секунды Unix (UTC)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {'spreads_compact' if legacy_spreads else 'spreads'} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                theme INTEGER NOT NULL,
+                cards BLOB NOT NULL,
+                created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                FOREIGN KEY (user_id) REFERENCES users(user_id)
+            )
+        ''')
+        if not legacy_spreads:
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        
+        # Создаем индексы
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_daily_prediction ON users(daily_prediction)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_spreads_user_date ON spreads(user_id, created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cards_names ON cards(name_en, name_ru)')
+
+        # Дневные агрегаты по удаленным старым раскладам:
+        # dimension — 'user', 'theme' или 'card', key — user_id или код
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS spread_rollup (
+                day TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                key INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, dimension, key)
+            ) WITHOUT ROWID
+        ''')
+
+        # Контрольные точки потокового импорта JSON (migrate_data):
+        # offset — позиция в байтах после последней записанной пачки
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_checkpoints (
+                source TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                finished BOOLEAN NOT NULL DEFAULT FALSE,
+                updated_at INTEGER
+            )
+        ''')
+
+        Database._create_counters(conn)
+        return legacy_spreads
+
+    def _migrate_spreads_compact(self, shard: DatabaseShard):
+        """Перенос старых текстовых раскладов в компактный формат.
+
+        Каждая пачка пишется отдельной транзакцией, поэтому прерванная
+        миграция продолжится с последнего перенесенного id.
+        """
+        migrated = 0
+        while True:
+            count = shard.pool.write_sync(self._migrate_spreads_batch, shard.codec, SPREADS_MIGRATION_BATCH)
+            if not count:
+                break
+            migrated += count
+            logging.info(f"Перенесено в компактный формат раскладов: {migrated}")
+        shard.pool.write_sync(self._finish_spreads_migration)
+        logging.info(f"Миграция раскладов в компактный формат завершена, всего {migrated}")
+
+    def _migrate_spreads_batch(self, conn: sqlite3.Connection, codec: SpreadCodec, batch_size: int) -> int:
+        try:
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM spreads_compact').fetchone()[0]
+            rows = conn.execute('''
+                SELECT id, user_id, theme, cards, CAST(strftime('%s', created_at) AS INTEGER)
+                FROM spreads
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            conn.executemany('''
+                INSERT INTO spreads_compact (id, user_id, theme, cards, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(
+                spread_id,
+                user_id,
+                codec.theme_code(conn, theme),
+                codec.encode_cards(conn, json.loads(cards)),
+                created_at
+            ) for spread_id, user_id, theme, cards, created_at in rows])
+            return len(rows)
+        except Exception:
+            codec.invalidate()
+            raise
+
+    def _finish_spreads_migration(self, conn: sqlite3.Connection):
+        """Замена старой таблицы раскладов компактной.
+
+        sqlite3 не открывает транзакцию перед DDL и фиксирует каждую команду
+        сразу, поэтому замена выполняется в явной транзакции: сбой между DROP
+        и RENAME иначе оставил бы базу без таблицы spreads.
+        """
+        conn.execute('BEGIN')
+        try:
+            conn.execute('DROP TABLE spreads')
+            conn.execute('ALTER TABLE spreads_compact RENAME TO spreads')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_spreads_user_date ON spreads(user_id, created_at)')
+            # Триггеры счетчиков удалились вместе со старой таблицей
+            self._create_counters(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def _create_counters(conn: sqlite3.Connection):
+        """Счетчики для get_stats, которые поддерживаются триггерами.
+
+        Удаление старых раскладов не уменьшает счетчики раскладов:
+        это статистика за всё время.
+        """
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # Количество раскладов по часам: 'YYYY-MM-DD HH'
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS spread_counts (
+                bucket TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS theme_counts (
+                theme TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_users_insert_counters AFTER INSERT ON users
+            BEGIN
+                UPDATE counters SET value = value + 1 WHERE name = 'total_users';
+                UPDATE counters SET value = value + (COALESCE(NEW.daily_prediction, 0) != 0)
+                WHERE name = 'daily_subscribers';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_users_delete_counters AFTER DELETE ON users
+            BEGIN
+                UPDATE counters SET value = value - 1 WHERE name = 'total_users';
+                UPDATE counters SET value = value - (COALESCE(OLD.daily_prediction, 0) != 0)
+                WHERE name = 'daily_subscribers';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_users_subscription_counters
+            AFTER UPDATE OF daily_prediction ON users
+            WHEN (COALESCE(NEW.daily_prediction, 0) != 0) != (COALESCE(OLD.daily_prediction, 0) != 0)
+            BEGIN
+                UPDATE counters
+                SET value = value + (COALESCE(NEW.daily_prediction, 0) != 0)
+                                  - (COALESCE(OLD.daily_prediction, 0) != 0)
+                WHERE name = 'daily_subscribers';
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_spreads_insert_counters AFTER INSERT ON spreads
+            BEGIN
+                UPDATE counters SET value = value + 1 WHERE name = 'total_spreads';
+                INSERT INTO spread_counts (bucket, count)
+                VALUES (strftime('%Y-%m-%d %H', NEW.created_at, 'unixepoch'), 1)
+                ON CONFLICT(bucket) DO UPDATE SET count = count + 1;
+                INSERT INTO theme_counts (theme, count)
+                VALUES ((SELECT name FROM theme_dict WHERE code = NEW.theme), 1)
+                ON CONFLICT(theme) DO UPDATE SET count = count + 1;
+            END
+        ''')
+
+        # Первичное заполнение счетчиков по уже накопленным данным
+        cursor.execute("SELECT 1 FROM counters WHERE name = 'total_users'")
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                INSERT INTO counters (name, value) VALUES
+                    ('total_users', (SELECT COUNT(*) FROM users)),
+                    ('daily_subscribers', (SELECT COUNT(*) FROM users WHERE daily_prediction = TRUE)),
+                    ('total_spreads', (SELECT COUNT(*) FROM spreads))
+            ''')
+            # Время хранится секундами Unix, в старой схеме — текстом
+            cursor.execute('''
+                INSERT INTO spread_counts (bucket, count)
+                SELECT strftime('%Y-%m-%d %H', CASE typeof(created_at)
+                    WHEN 'integer' THEN datetime(created_at, 'unixepoch')
+                    ELSE created_at
+                END), COUNT(*)
+                FROM spreads
+                GROUP BY 1
+            ''')
+            # Тема хранится кодом, в старой схеме — текстом
+            cursor.execute('''
+                INSERT INTO theme_counts (theme, count)
+                SELECT COALESCE(theme_dict.name, spreads.theme), COUNT(*)
+                FROM spreads
+                LEFT JOIN theme_dict ON theme_dict.code = spreads.theme
+                GROUP BY spreads.theme
+            ''')
+
+    async def migrate_data(self, batch_size: int = DB_IMPORT_BATCH) -> Dict[str, Dict[str, Any]]:
+        """Миграция данных из JSON файлов в SQLite.
+
+        Файлы читаются потоково и записываются пачками executemany по
+        batch_size строк. После каждой пачки позиция в файле сохраняется
+        в import_checkpoints, поэтому прерванный импорт продолжается с неё.
+        Повторная запись пачки безопасна: пользователи пишутся через UPSERT,
+        карты — через INSERT OR REPLACE. Возвращает отчёт по каждому файлу.
+        """
+        report = {}
         try:
             # Миграция данных пользователей
             users_path = Path('data/users.json')
             if users_path.exists():
-                async with self._lock:
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        with open(users_path) as f:
-                            users_data = json.load(f)
-                            for user_id, user_data in users_data.items():
-                                cursor.execute('''
-                                    INSERT OR REPLACE INTO users 
-                                    (user_id, spreads_today, last_spread_date, theme, 
-                                     show_images, daily_prediction)
-                                    VALUES (?, ?, ?, ?, ?, ?)
-                                ''', (
-                                    int(user_id),
-                                    user_data.get('spreads_today', 0),
-                                    user_data.get('last_spread_date', ''),
-                                    user_data.get('theme', 'light'),
-                                    user_data.get('show_images', True),
-                                    user_data.get('daily_prediction', False)
-                                ))
-                        conn.commit()
-                        logging.info("Данные пользователей успешно мигрированы")
+                report['users'] = await self._import_json(
+                    users_path, self._user_import_rows, self._write_user_rows, batch_size
+                )
+                logging.info("Данные пользователей успешно мигрированы")
 
             # Миграция данных карт
             cards_path = Path('data/tarot_deck.json')
             if cards_path.exists():
-                async with self._lock:
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        with open(cards_path, 'r', encoding='utf-8') as f:
-                            deck_data = json.load(f)
-                            
-                            # Словарь соответствия русских названий английским
-                            name_mapping = {
-                                # Старшие арканы
-                                "Шут": "The Fool",
-                                "Маг": "The Magician",
-                                "Верховная Жрица": "The High Priestess",
-                                "Императрица": "The Empress",
-                                "Император": "The Emperor",
-                                "Иерофант": "The Hierophant",
-                                "Влюбленные": "The Lovers",
-                                "Колесница": "The Chariot",
-                                "Сила": "Strength",
-                                "Отшельник": "The Hermit",
-                                "Колесо Фортуны": "Wheel of Fortune",
-                                "Справедливость": "Justice",
-                                "Повешенный": "The Hanged Man",
-                                "Смерть": "Death",
-                                "Умеренность": "Temperance",
-                                "Дьявол": "The Devil",
-                                "Башня": "The Tower",
-                                "Звезда": "The Star",
-                                "Луна": "The Moon",
-                                "Солнце": "The Sun",
-                                "Суд": "Judgement",
-                                "Мир": "The World",
-                            }
-                            
-                            # Обработка Старших арканов
-                            for ru_name, card_data in deck_data["Старшие арканы"].items():
-                                en_name = name_mapping.get(ru_name, ru_name)
-                                cursor.execute('''
-                                    INSERT OR REPLACE INTO cards 
-                                    (name_en, name_ru, meaning, history, finances,
-                                     relationships, career, daily, weekly, monthly, hint)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                ''', (
-                                    en_name,
-                                    ru_name,
-                                    card_data.get('meaning', ''),
-                                    card_data.get('history', ''),
-                                    card_data.get('Финансы', ''),
-                                    card_data.get('Отношения', ''),
-                                    card_data.get('Карьера', ''),
-                                    card_data.get('Карта на сегодня', ''),
-                                    card_data.get('Карта на неделю', ''),
-                                    card_data.get('Карта на месяц', ''),
-                                    card_data.get('Подсказка', '')
-                                ))
-                            
-                            # Обработка Младших арканов
-                            for suit, cards in deck_data["Младшие арканы"].items():
-                                for ru_name, card_data in cards.items():
-                                    # Формируем английское название для младших арканов
-                                    parts = ru_name.split()
-                                    if len(parts) >= 2:
-                                        rank = parts[0]
-                                        rank_map = {
-                                            "Туз": "Ace",
-                                            "Двойка": "Two",
-                                            "Тройка": "Three",
-                                            "Четверка": "Four",
-                                            "Пятерка": "Five",
-                                            "Шестерка": "Six",
-                                            "Семерка": "Seven",
-                                            "Восьмерка": "Eight",
-                                            "Девятка": "Nine",
-                                            "Десятка": "Ten",
-                                            "Паж": "Page",
-                                            "Рыцарь": "Knight",
-                                            "Королева": "Queen",
-                                            "Король": "King"
-                                        }
-                                        suit_map = {
-                                            "Жезлов": "Wands",
-                                            "Кубков": "Cups",
-                                            "Мечей": "Swords",
-                                            "Пентаклей": "Pentacles"
-                                        }
-                                        en_rank = rank_map.get(rank, rank)
-                                        en_suit = suit_map.get(parts[-1], parts[-1])
-                                        en_name = f"{en_rank} of {en_suit}"
-                                    else:
-                                        en_name = ru_name
-
-                                    cursor.execute('''
-                                        INSERT OR REPLACE INTO cards 
-                                        (name_en, name_ru, meaning, history, finances,
-                                         relationships, career, daily, weekly, monthly, hint)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                    ''', (
-                                        en_name,
-                                        ru_name,
-                                        card_data.get('meaning', ''),
-                                        card_data.get('history', ''),
-                                        card_data.get('Финансы', ''),
-                                        card_data.get('Отношения', ''),
-                                        card_data.get('Карьера', ''),
-                                        card_data.get('Карта на сегодня', ''),
-                                        card_data.get('Карта на неделю', ''),
-                                        card_data.get('Карта на месяц', ''),
-                                        card_data.get('Подсказка', '')
-                                    ))
-                            
-                        conn.commit()
-                        logging.info("Данные карт успешно мигрированы")
+                report['cards'] = await self._import_json(
+                    cards_path, self._card_import_rows, self._write_card_rows, batch_size
+                )
+                logging.info("Данные карт успешно мигрированы")
 
         except Exception as e:
             logging.error(f"Ошибка при миграции данных: {e}")
             raise
+        return report
+
+    async def _import_json(self, path: Path, to_rows: Callable[[str, Any], List[tuple]],
+                           write: Callable[[List[tuple], tuple], Awaitable[None]], batch_size: int) -> Dict[str, Any]:
+        """Потоковый импорт JSON-объекта с контрольными точками."""
+        source = str(path)
+        stat = path.stat()
+        checkpoint = await self._main.pool.read(self._get_import_checkpoint, source)
+        if checkpoint and (checkpoint[2], checkpoint[3]) != (stat.st_size, stat.st_mtime_ns):
+            # Файл изменился: позиция в нём больше ничего не значит
+            checkpoint = None
+        if checkpoint and checkpoint[4]:
+            logging.info(f"Импорт {path.name} уже выполнен ({checkpoint[1]} строк), пропускаем")
+            return {'rows': checkpoint[1], 'skipped': True}
+
+        start_offset, total = (checkpoint[0], checkpoint[1]) if checkpoint else (0, 0)
+        if start_offset:
+            logging.info(f"Импорт {path.name} продолжается с байта {start_offset} ({total} строк уже записано)")
+
+        members = iter_json_object(path, start_offset)
+
+        def next_batch() -> Tuple[List[tuple], Optional[int]]:
+            # Пачка заканчивается на границе пары, чтобы позиция была корректной
+            rows, offset = [], None
+            for key, value, offset in members:
+                rows.extend(to_rows(key, value))
+                if len(rows) >= batch_size:
+                    break
+            return rows, offset
+
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        imported = 0
+        offset = start_offset
+        while True:
+            # Чтение и разбор файла — в отдельном потоке, как и запись
+            rows, batch_offset = await loop.run_in_executor(None, next_batch)
+            if batch_offset is None:
+                break
+            offset = batch_offset
+            imported += len(rows)
+            # Контрольная точка пишется в одной транзакции с пачкой первого шарда
+            await write(rows, (source, offset, total + imported, stat.st_size, stat.st_mtime_ns, False))
+            elapsed = time.perf_counter() - start_time
+            logging.info(
+                f"Импорт {path.name}: {total + imported} строк, "
+                f"{offset / max(stat.st_size, 1):.0%} файла, {imported / max(elapsed, 1e-9):.0f} строк/с"
+            )
+
+        await self._main.pool.write(
+            self._save_import_checkpoint, source, offset, total + imported, stat.st_size, stat.st_mtime_ns, True
+        )
+        elapsed = time.perf_counter() - start_time
+        return {
+            'rows': total + imported,
+            'imported': imported,
+            'resumed_from': start_offset,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(imported / elapsed) if elapsed else 0,
+            'skipped': False
+        }
+
+    def _get_import_checkpoint(self, conn: sqlite3.Connection, source: str) -> Optional[tuple]:
+        return conn.execute('''
+            SELECT offset, rows, size, mtime, finished FROM import_checkpoints WHERE source = ?
+        ''', (source,)).fetchone()
+
+    def _save_import_checkpoint(self, conn: sqlite3.Connection, source: str, offset: int, rows: int,
+                                size: int, mtime: int, finished: bool):
+        conn.execute('''
+            INSERT INTO import_checkpoints (source, offset, rows, size, mtime, finished, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+            ON CONFLICT(source) DO UPDATE SET
+                offset = excluded.offset,
+                rows = excluded.rows,
+                size = excluded.size,
+                mtime = excluded.mtime,
+                finished = excluded.finished,
+                updated_at = excluded.updated_at
+        ''', (source, offset, rows, size, mtime, finished))
+
+    def _user_import_rows(self, user_id: str, user_data: Dict[str, Any]) -> List[tuple]:
+        """Пользователь из users.json в строку для UPSERT."""
+        return [(
+            int(user_id),
+            user_data.get('spreads_today', 0),
+            user_data.get('last_spread_date', ''),
+            user_data.get('theme', 'light'),
+            user_data.get('show_images', True),
+            user_data.get('daily_prediction', False)
+        )]
+
+    async def _write_user_rows(self, rows: List[tuple], checkpoint: tuple):
+        # Строки группируются по шардам: по транзакции на шард. Первый шард
+        # пишется последним вместе с контрольной точкой, поэтому она
+        # сохраняется, только когда записаны все шарды
+        shards: Dict[int, List[tuple]] = {}
+        for row in rows:
+            shards.setdefault(shard_index(row[0], len(self._shards)), []).append(row)
+        await asyncio.gather(*(
+            self._shards[index].pool.write(self._migrate_users, shard_rows)
+            for index, shard_rows in shards.items() if index != 0
+        ))
+        await self._main.pool.write(self._migrate_users, shards.get(0, []), checkpoint)
+
+    def _migrate_users(self, conn: sqlite3.Connection, rows: List[tuple], checkpoint: Optional[tuple] = None):
+        """Перенос пользователей из JSON в таблицу users."""
+        # UPSERT вместо INSERT OR REPLACE: REPLACE не вызывает
+        # триггер удаления и сбил бы счетчик пользователей
+        conn.executemany(_upsert_users_sql(tuple(DEFAULT_USER)), rows)
+        if checkpoint:
+            self._save_import_checkpoint(conn, *checkpoint)
+
+    async def _write_card_rows(self, rows: List[tuple], checkpoint: tuple):
+        await self._main.pool.write(self._migrate_cards, rows, checkpoint)
+
+    def _migrate_cards(self, conn: sqlite3.Connection, rows: List[tuple], checkpoint: tuple):
+        """Перенос колоды из JSON в таблицу cards."""
+        self._save_import_checkpoint(conn, *checkpoint)
+        conn.executemany('''
+            INSERT OR REPLACE INTO cards 
+            (name_en, name_ru, meaning, history, finances,
+             relationships, career, daily, weekly, monthly, hint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    @staticmethod
+    def _card_row(en_name: str, ru_name: str, card_data: Dict[str, Any]) -> tuple:
+        return (
+            en_name,
+            ru_name,
+            card_data.get('meaning', ''),
+            card_data.get('history', ''),
+            card_data.get('Финансы', ''),
+            card_data.get('Отношения', ''),
+            card_data.get('Карьера', ''),
+            card_data.get('Карта на сегодня', ''),
+            card_data.get('Карта на неделю', ''),
+            card_data.get('Карта на месяц', ''),
+            card_data.get('Подсказка', '')
+        )
+
+    def _card_import_rows(self, section: str, cards: Dict[str, Any]) -> List[tuple]:
+        """Раздел колоды из tarot_deck.json в строки таблицы cards."""
+        rows = []
+        # Словарь соответствия русских названий английским
+        name_mapping = {
+            # Старшие арканы
+            "Шут": "The Fool",
+            "Маг": "The Magician",
+            "Верховная Жрица": "The High Priestess",
+            "Императрица": "The Empress",
+            "Император": "The Emperor",
+            "Иерофант": "The Hierophant",
+            "Влюбленные": "The Lovers",
+            "Колесница": "The Chariot",
+            "Сила": "Strength",
+            "Отшельник": "The Hermit",
+            "Колесо Фортуны": "Wheel of Fortune",
+            "Справедливость": "Justice",
+            "Повешенный": "The Hanged Man",
+            "Смерть": "Death",
+            "Умеренность": "Temperance",
+            "Дьявол": "The Devil",
+            "Башня": "The Tower",
+            "Звезда": "The Star",
+            "Луна": "The Moon",
+            "Солнце": "The Sun",
+            "Суд": "Judgement",
+            "Мир": "The World",
+        }
+
+        if section == "Старшие арканы":
+            for ru_name, card_data in cards.items():
+                en_name = name_mapping.get(ru_name, ru_name)
+                rows.append(self._card_row(en_name, ru_name, card_data))
+
+        elif section == "Младшие арканы":
+            for suit, suit_cards in cards.items():
+                for ru_name, card_data in suit_cards.items():
+                    # Формируем английское название для младших арканов
+                    parts = ru_name.split()
+                    if len(parts) >= 2:
+                        rank = parts[0]
+                        rank_map = {
+                            "Туз": "Ace",
+                            "Двойка": "Two",
+                            "Тройка": "Three",
+                            "Четверка": "Four",
+                            "Пятерка": "Five",
+                            "Шестерка": "Six",
+                            "Семерка": "Seven",
+                            "Восьмерка": "Eight",
+                            "Девятка": "Nine",
+                            "Десятка": "Ten",
+                            "Паж": "Page",
+                            "Рыцарь": "Knight",
+                            "Королева": "Queen",
+                            "Король": "King"
+                        }
+                        suit_map = {
+                            "Жезлов": "Wands",
+                            "Кубков": "Cups",
+                            "Мечей": "Swords",
+                            "Пентаклей": "Pentacles"
+                        }
+                        en_rank = rank_map.get(rank, rank)
+                        en_suit = suit_map.get(parts[-1], parts[-1])
+                        en_name = f"{en_rank} of {en_suit}"
+                    else:
+                        en_name = ru_name
+
+                    rows.append(self._card_row(en_name, ru_name, card_data))
+        return rows
 
     async def get_user(self, user_id: int) -> Optional[Dict]:
         """Получение данных пользователя."""
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        return {
-                            'user_id': row[0],
-                            'spreads_today': row[1],
-                            'last_spread_date': row[2],
-                            'theme': row[3],
-                            'show_images': bool(row[4]),
-                            'daily_prediction': bool(row[5])
-                        }
-                    return None
+            user = await self._shard(user_id).pool.read(self._get_user, user_id)
         except Exception as e:
             logging.error(f"Ошибка при получении данных пользователя {user_id}: {e}")
             return None
 
+        return self._overlay_pending(user_id, user)
+
+    def _overlay_pending(self, user_id: int, user: Optional[Dict]) -> Optional[Dict]:
+        """Наложение изменений, которые ещё ждут записи в очереди."""
+        pending = self._shard(user_id).write_queue.pending_user(user_id)
+        if pending:
+            if user is None:
+                user = dict(DEFAULT_USER, user_id=user_id)
+            user.update(pending)
+            user['show_images'] = bool(user['show_images'])
+            user['daily_prediction'] = bool(user['daily_prediction'])
+        return user
+
+    def _get_user(self, conn: sqlite3.Connection, user_id: int) -> Optional[Dict]:
+        row = conn.execute(sql.GET_USER, (user_id,)).fetchone()
+        return _user_dict(row) if row else None
+
     async def update_user(self, user_id: int, **kwargs) -> bool:
-        """Обновляет данные пользователя в базе данных."""
+        """Обновляет данные пользователя в базе данных (UPSERT)."""
+        if not kwargs:
+            return False
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    
-                    # Формируем SET часть запроса динамически
-                    set_parts = []
-                    values = []
-                    for key, value in kwargs.items():
-                        set_parts.append(f"{key} = ?")
-                        values.append(value)
-                    
-                    if not set_parts:
-                        return False
-                    
-                    # Проверяем существует ли пользователь
-                    cursor.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,))
-                    user_exists = cursor.fetchone() is not None
-                    
-                    if user_exists:
-                        # Обновляем существующего пользователя
-                        query = f"""
-                            UPDATE users 
-                            SET {', '.join(set_parts)}
-                            WHERE user_id = ?
-                        """
-                        values.append(user_id)
-                        cursor.execute(query, values)
-                    else:
-                        # Создаем нового пользователя
-                        columns = ['user_id'] + list(kwargs.keys())
-                        placeholders = ['?'] * (len(kwargs) + 1)
-                        query = f"""
-                            INSERT INTO users ({', '.join(columns)})
-                            VALUES ({', '.join(placeholders)})
-                        """
-                        cursor.execute(query, [user_id] + values)
-                    
-                    conn.commit()
-                    return True
-                    
+            _check_user_columns(kwargs)
+            # Прямая запись новее отложенной: не даём очереди её перезаписать
+            shard = self._shard(user_id)
+            shard.write_queue.discard_user_fields(user_id, kwargs)
+            await shard.pool.write(self._update_user, user_id, kwargs)
+            return True
         except Exception as e:
             logging.error(f"Ошибка при обновлении пользователя {user_id}: {e}")
             return False
 
+    def _update_user(self, conn: sqlite3.Connection, user_id: int, fields: Dict[str, Any]):
+        columns = tuple(fields)
+        conn.execute(_upsert_users_sql(columns), (user_id, *fields.values()))
+
+    async def bulk_update_users(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Пакетный UPSERT пользователей через executemany.
+
+        Каждая строка — словарь с ключом user_id и изменяемыми колонками.
+        Возвращает количество записанных строк.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        try:
+            # Строки группируются по шардам: по транзакции на шард
+            shards: Dict[int, Dict[int, Dict[str, Any]]] = {}
+            for row in rows:
+                fields = {k: v for k, v in row.items() if k != 'user_id'}
+                _check_user_columns(fields)
+                users = shards.setdefault(shard_index(row['user_id'], len(self._shards)), {})
+                users.setdefault(row['user_id'], {}).update(fields)
+            for index, users in shards.items():
+                for user_id, fields in users.items():
+                    self._shards[index].write_queue.discard_user_fields(user_id, fields)
+            await asyncio.gather(*(
+                self._shards[index].pool.write(self._bulk_update_users, users)
+                for index, users in shards.items()
+            ))
+            return len(rows)
+        except Exception as e:
+            logging.error(f"Ошибка при пакетном обновлении пользователей: {e}")
+            return 0
+
+    def _bulk_update_users(self, conn: sqlite3.Connection, users: Dict[int, Dict[str, Any]]):
+        # Группируем строки по набору колонок: один executemany на группу
+        groups: Dict[tuple, List[tuple]] = {}
+        for user_id, fields in users.items():
+            if not fields:
+                continue
+            columns = tuple(sorted(fields))
+            groups.setdefault(columns, []).append((user_id, *(fields[c] for c in columns)))
+        for columns, params in groups.items():
+            conn.executemany(_upsert_users_sql(columns), params)
+
+    async def reserve_spread(self, user_id: int, limit: int, today: str) -> Optional[Dict]:
+        """Атомарная проверка дневного лимита и учёт нового расклада.
+
+        Возвращает обновлённую запись пользователя, если расклад разрешён,
+        и None, если лимит на сегодня исчерпан. Ошибка базы данных
+        пробрасывается, чтобы её нельзя было принять за исчерпанный лимит.
+        """
+        # Счётчик меняется только здесь, отложенные значения устарели
+        shard = self._shard(user_id)
+        shard.write_queue.discard_user_fields(user_id, ('spreads_today', 'last_spread_date'))
+        try:
+            user = await shard.pool.write(self._reserve_spread, user_id, limit, today)
+        except Exception as e:
+            logging.error(f"Ошибка при резервировании расклада для пользователя {user_id}: {e}")
+            raise
+        # Прочие отложенные изменения пользователя ещё не записаны
+        return self._overlay_pending(user_id, user) if user else None
+
+    def _reserve_spread(self, conn: sqlite3.Connection, user_id: int, limit: int, today: str) -> Optional[Dict]:
+        # Сброс счётчика в новый день, проверка лимита и инкремент одним запросом
+        row = conn.execute(sql.RESERVE_SPREAD, {'user_id': user_id, 'today': today, 'limit': limit}).fetchone()
+        return _user_dict(row) if row else None
+
+    def enqueue_user_update(self, user_id: int, **kwargs) -> None:
+        """Отложенное обновление пользователя через очередь группового коммита."""
+        if kwargs:
+            _check_user_columns(kwargs)
+            self._shard(user_id).write_queue.put_user(user_id, kwargs)
+
     async def get_card(self, name_en: str) -> Optional[Dict]:
         """Получение информации о карте."""
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT * FROM cards WHERE name_en = ?', (name_en,))
-                    row = cursor.fetchone()
-                    if row:
-                        return {
-                            'en': row[1],
-                            'ru': row[2],
-                            'meaning': row[3],
-                            'history': row[4],
-                            'Финансы': row[5],
-                            'Отношения': row[6],
-                            'Карьера': row[7],
-                            'Карта на сегодня': row[8],
-                            'Карта на неделю': row[9],
-                            'Карта на месяц': row[10],
-                            'Подсказка': row[11]
-                        }
-                    return None
+            return await self._main.pool.read(self._get_card, name_en)
         except Exception as e:
             logging.error(f"Ошибка при получении карты {name_en}: {e}")
             return None
 
+    def _get_card(self, conn: sqlite3.Connection, name_en: str) -> Optional[Dict]:
+        cursor = conn.execute(sql.GET_CARD, (name_en,))
+        row = cursor.fetchone()
+        if row:
+            return {
+                'en': row[1],
+                'ru': row[2],
+                'meaning': row[3],
+                'history': row[4],
+                'Финансы': row[5],
+                'Отношения': row[6],
+                'Карьера': row[7],
+                'Карта на сегодня': row[8],
+                'Карта на неделю': row[9],
+                'Карта на месяц': row[10],
+                'Подсказка': row[11]
+            }
+        return None
+
     async def get_daily_subscribers(self) -> List[int]:
         """Получение списка подписчиков на ежедневные предсказания."""
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT user_id FROM users WHERE daily_prediction = TRUE')
-                    return [row[0] for row in cursor.fetchall()]
+            parts = await asyncio.gather(*(shard.pool.read(self._get_daily_subscribers) for shard in self._shards))
         except Exception as e:
             logging.error(f"Ошибка при получении списка подписчиков: {e}")
-            return [] 
+            return []
+        return list(heapq.merge(*parts))
+
+    def _get_daily_subscribers(self, conn: sqlite3.Connection) -> List[int]:
+        cursor = conn.execute('SELECT user_id FROM users WHERE daily_prediction = TRUE ORDER BY user_id')
+        return [row[0] for row in cursor.fetchall()]
+
+    async def iter_daily_subscribers(self, batch_size: int = 1000,
+                                     after_id: int = 0) -> AsyncIterator[List[int]]:
+        """Потоковая выдача подписчиков пачками по batch_size в порядке user_id.
+
+        after_id позволяет продолжить обход с места остановки: выдаются
+        только пользователи с user_id больше него.
+        """
+        # Недавние изменения подписки ещё могут лежать в очереди записи
+        await self.flush()
+        if len(self._shards) == 1:
+            async for batch in self._iter_shard_subscribers(self._main, batch_size, after_id):
+                yield batch
+            return
+
+        # Слияние потоков шардов: пачки идут в общем порядке user_id,
+        # поэтому after_id из последней пачки по-прежнему годится для продолжения
+        iterators = [self._iter_shard_subscribers(shard, batch_size, after_id) for shard in self._shards]
+        buffers = [deque() for _ in iterators]
+        active = set(range(len(iterators)))
+        batch = []
+        while True:
+            for index in [i for i in active if not buffers[i]]:
+                chunk = await anext(iterators[index], None)
+                if chunk is None:
+                    active.discard(index)
+                else:
+                    buffers[index].extend(chunk)
+            if not any(buffers):
+                break
+            # Берём подписчиков, пока ни один из активных шардов не опустел:
+            # иначе в его следующей пачке могут оказаться меньшие user_id
+            while len(batch) < batch_size and all(buffers[i] for i in active):
+                filled = [i for i, buffer in enumerate(buffers) if buffer]
+                if not filled:
+                    break
+                index = min(filled, key=lambda i: buffers[i][0])
+                batch.append(buffers[index].popleft())
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _iter_shard_subscribers(self, shard: DatabaseShard, batch_size: int,
+                                      after_id: int, retries: int = 3) -> AsyncIterator[List[int]]:
+        """Подписчики одного шарда пачками в порядке user_id.
+
+        Ошибка чтения повторяется с последнего after_id не больше retries
+        раз подряд, затем пробрасывается: обход не обрывается молча.
+        """
+        failures = 0
+        while True:
+            try:
+                batch = await shard.pool.read(self._get_daily_subscribers_batch, after_id, batch_size)
+            except Exception as e:
+                failures += 1
+                logging.error(f"Ошибка при получении подписчиков после {after_id} (попытка {failures}): {e}")
+                if failures > retries:
+                    raise
+                await asyncio.sleep(0.1 * failures)
+                continue
+            failures = 0
+            if batch:
+                yield batch
+                after_id = batch[-1]
+            if len(batch) < batch_size:
+                return
+
+    def _get_daily_subscribers_batch(self, conn: sqlite3.Connection, after_id: int, batch_size: int) -> List[int]:
+        cursor = conn.execute(sql.GET_DAILY_SUBSCRIBERS_BATCH, (after_id, batch_size))
+        return [row[0] for row in cursor.fetchall()]
 
     async def save_spread(self, user_id: int, theme: str, cards: str) -> bool:
         """Сохранение расклада в базу данных."""
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        INSERT INTO spreads (user_id, theme, cards)
-                        VALUES (?, ?, ?)
-                    ''', (user_id, theme, cards))
-                    conn.commit()
-                    return True
+            SpreadCodec.check_spread(theme, json.loads(cards))
+            shard = self._shard(user_id)
+            await shard.pool.write(self._save_spread, shard.codec, user_id, theme, cards)
+            return True
         except Exception as e:
             logging.error(f"Ошибка при сохранении расклада: {e}")
             return False
 
+    def _save_spread(self, conn: sqlite3.Connection, codec: SpreadCodec, user_id: int, theme: str, cards: str):
+        try:
+            conn.execute(sql.INSERT_SPREAD, (user_id, codec.theme_code(conn, theme), codec.encode_cards(conn, json.loads(cards))))
+        except Exception:
+            # Коды, выданные в откаченной транзакции, недействительны
+            codec.invalidate()
+            raise
+
+    def enqueue_spread(self, user_id: int, theme: str, cards: str) -> None:
+        """Отложенное сохранение расклада через очередь группового коммита.
+
+        Некорректный расклад отклоняется ValueError до постановки в очередь.
+        """
+        SpreadCodec.check_spread(theme, json.loads(cards))
+        self._shard(user_id).write_queue.put_spread(user_id, theme, cards, int(time.time()))
+
+    def _apply_write_batch(self, conn: sqlite3.Connection, codec: SpreadCodec,
+                           users: Dict[int, Dict[str, Any]], spreads: List[tuple]):
+        """Запись пачки из очереди в рамках одной транзакции."""
+        self._bulk_update_users(conn, users)
+        if spreads:
+            try:
+                conn.executemany(sql.INSERT_SPREAD_AT, [(
+                    user_id,
+                    codec.theme_code(conn, theme),
+                    codec.encode_cards(conn, json.loads(cards)),
+                    created_at
+                ) for user_id, theme, cards, created_at in spreads])
+            except Exception:
+                codec.invalidate()
+                raise
+
+    async def flush(self) -> None:
+        """Принудительный сброс очереди отложенной записи."""
+        await asyncio.gather(*(shard.write_queue.flush() for shard in self._shards))
+
+    def get_write_queue_stats(self) -> Dict[str, Any]:
+        """Метрики очереди отложенной записи: глубина и задержки сброса."""
+        if len(self._shards) == 1:
+            return self._main.write_queue.get_stats()
+        # Для нескольких шардов счетчики суммируются, задержки — худшие
+        shards = [shard.write_queue.get_stats() for shard in self._shards]
+        stats = {}
+        for key in shards[0]:
+            values = [part[key] for part in shards]
+            stats[key] = max(values) if 'latency' in key else sum(values)
+        stats['shards'] = shards
+        return stats
+
     async def get_last_spread(self, user_id: int) -> Optional[Dict]:
         """Получение последнего расклада пользователя."""
+        shard = self._shard(user_id)
+        pending = shard.write_queue.pending_last_spread(user_id)
+        if pending:
+            return _spread_dict((pending[1], json.loads(pending[2]), _format_timestamp(pending[3])))
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        SELECT theme, cards, created_at
-                        FROM spreads
-                        WHERE user_id = ?
-                        ORDER BY created_at DESC
-                        LIMIT 1
-                    ''', (user_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        return {
-                            'theme': row[0],
-                            'cards': json.loads(row[1]),
-                            'created_at': row[2]
-                        }
-                    return None
+            return await shard.pool.read(self._get_last_spread, shard.codec, user_id)
         except Exception as e:
             logging.error(f"Ошибка при получении последнего расклада: {e}")
             return None
 
+    def _get_last_spread(self, conn: sqlite3.Connection, codec: SpreadCodec, user_id: int) -> Optional[Dict]:
+        row = conn.execute(sql.GET_LAST_SPREAD, (user_id,)).fetchone()
+        return self._decode_spread(conn, codec, row) if row else None
+
+    def _decode_spread(self, conn: sqlite3.Connection, codec: SpreadCodec, row: tuple) -> Dict[str, Any]:
+        """Строка (theme, cards, created_at) в словарь с названиями карт и темы."""
+        return _spread_dict((codec.theme_name(conn, row[0]), codec.decode_cards(conn, row[1]), row[2]))
+
     async def get_user_spreads(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Получение истории раскладов пользователя."""
+        rows, _ = await self.get_user_spreads_page(user_id, limit)
+        return rows
+
+    async def get_user_spreads_page(self, user_id: int, limit: int = 10,
+                                    cursor: Optional[Tuple[int, int]] = None) -> Tuple[List[Dict], Optional[Tuple[int, int]]]:
+        """Страница истории раскладов от новых к старым.
+
+        cursor — значение, которое вернул предыдущий вызов; None для первой
+        страницы. Возвращает строки и курсор следующей страницы (None, если
+        история закончилась).
+        """
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        SELECT theme, cards, created_at
-                        FROM spreads
-                        WHERE user_id = ?
-                        ORDER BY created_at DESC
-                        LIMIT ?
-                    ''', (user_id, limit))
-                    return [{
-                        'theme': row[0],
-                        'cards': json.loads(row[1]),
-                        'created_at': row[2]
-                    } for row in cursor.fetchall()]
+            shard = self._shard(user_id)
+            return await shard.pool.read(self._get_user_spreads_page, shard.codec, user_id, limit, cursor)
         except Exception as e:
             logging.error(f"Ошибка при получении истории раскладов: {e}")
-            return []
+            return [], None
+
+    def _get_user_spreads_page(self, conn: sqlite3.Connection, codec: SpreadCodec, user_id: int, limit: int,
+                               cursor: Optional[Tuple[int, int]]) -> Tuple[List[Dict], Optional[Tuple[int, int]]]:
+        # Keyset-пагинация по индексу idx_spreads_user_date (user_id, created_at, rowid)
+        if cursor is None:
+            rows = conn.execute(sql.GET_USER_SPREADS_FIRST, (user_id, limit)).fetchall()
+        else:
+            rows = conn.execute(sql.GET_USER_SPREADS_AFTER, (user_id, cursor[0], cursor[1], limit)).fetchall()
+        next_cursor = (rows[-1][3], rows[-1][4]) if len(rows) == limit else None
+        return [self._decode_spread(conn, codec, row) for row in rows], next_cursor
+
+    async def iter_user_spreads(self, user_id: int, chunk_size: int = 100,
+                                cursor: Optional[Tuple[int, int]] = None) -> AsyncIterator[List[Dict]]:
+        """Потоковый обход всей истории раскладов пачками по chunk_size.
+
+        В памяти одновременно находится только одна пачка, поэтому экран
+        истории или экспорт могут пройти тысячи раскладов.
+        """
+        while True:
+            rows, cursor = await self.get_user_spreads_page(user_id, chunk_size, cursor)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+
+    async def rollup_old_spreads(self, cutoff: int, batch_size: int = 500) -> int:
+        """Свертка и удаление одной пачки раскладов старше cutoff (секунды Unix).
+
+        Возвращает количество удаленных строк; 0 — старых раскладов не осталось.
+        Каждая пачка — короткая отдельная транзакция, по одной в каждом шарде.
+        """
+        try:
+            counts = await asyncio.gather(*(
+                shard.pool.write(self._rollup_old_spreads, cutoff, batch_size) for shard in self._shards
+            ))
+            return sum(counts)
+        except Exception as e:
+            logging.error(f"Ошибка при свертке старых раскладов: {e}")
+            return 0
+
+    def _rollup_old_spreads(self, conn: sqlite3.Connection, cutoff: int, batch_size: int) -> int:
+        # Самые старые строки лежат в начале по id: чтение идет по rowid без сканирования.
+        # Строки без created_at пропускаются и не удаляются, но и не останавливают очистку
+        rows = conn.execute('''
+            SELECT id, user_id, theme, cards, created_at
+            FROM spreads
+            WHERE created_at IS NOT NULL
+            ORDER BY id
+            LIMIT ?
+        ''', (batch_size,)).fetchall()
+        expired = []
+        for row in rows:
+            if row[4] >= cutoff:
+                break
+            expired.append(row)
+        if not expired:
+            return 0
+
+        rollup: Dict[tuple, int] = {}
+        for _, user_id, theme, cards, created_at in expired:
+            day = time.strftime('%Y-%m-%d', time.gmtime(created_at))
+            for key in [(day, 'user', user_id), (day, 'theme', theme)] + [(day, 'card', code) for code in cards]:
+                rollup[key] = rollup.get(key, 0) + 1
+        conn.executemany('''
+            INSERT INTO spread_rollup (day, dimension, key, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(day, dimension, key) DO UPDATE SET count = count + excluded.count
+        ''', [(*key, count) for key, count in rollup.items()])
+        conn.execute('DELETE FROM spreads WHERE id <= ? AND created_at IS NOT NULL', (expired[-1][0],))
+        return len(expired)
+
+    async def analyze(self, analysis_limit: int = 1000) -> AsyncIterator[str]:
+        """Обновление статистики планировщика запросов по одной таблице за раз.
+
+        Каждая таблица анализируется отдельной короткой командой
+        (analysis_limit ограничивает число просматриваемых строк индекса),
+        после каждой выдаётся её имя, чтобы вызывающий мог уступить
+        event loop. В конце для каждого шарда выполняется PRAGMA optimize.
+        """
+        for shard in self._shards:
+            try:
+                tables = await shard.pool.read(self._get_tables)
+                for table in tables:
+                    await shard.pool.write(self._analyze_table, table, analysis_limit)
+                    yield table
+                await shard.pool.write(self._optimize)
+            except Exception as e:
+                logging.error(f"Ошибка при анализе таблиц шарда {shard.index}: {e}")
+
+    def _get_tables(self, conn: sqlite3.Connection) -> List[str]:
+        rows = conn.execute('''
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+            ORDER BY name
+        ''').fetchall()
+        return [row[0] for row in rows]
+
+    def _analyze_table(self, conn: sqlite3.Connection, table: str, analysis_limit: int):
+        conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+        conn.execute(f'ANALYZE "{table}"')
+
+    def _optimize(self, conn: sqlite3.Connection):
+        conn.execute('PRAGMA optimize')
+
+    async def incremental_vacuum(self, pages: int = 256) -> int:
+        """Возврат не более pages свободных страниц в каждом шарде.
+
+        Возвращает число освобождённых страниц; 0 — свободных страниц не
+        осталось (или файл создан без auto_vacuum = INCREMENTAL).
+        """
+        try:
+            counts = await asyncio.gather(*(
+                shard.pool.write(self._incremental_vacuum, pages) for shard in self._shards
+            ))
+            return sum(counts)
+        except Exception as e:
+            logging.error(f"Ошибка при инкрементальной очистке базы данных: {e}")
+            return 0
+
+    def _incremental_vacuum(self, conn: sqlite3.Connection, pages: int) -> int:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        # Прагма выполняет очистку по мере чтения результата
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+        return before - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    async def enable_incremental_vacuum(self) -> int:
+        """Перевод старых файлов в режим auto_vacuum = INCREMENTAL.
+
+        Для существующего файла режим меняется только полным VACUUM,
+        который блокирует запись на время перестройки и требует двойного
+        запаса места, поэтому вызывается только вручную
+        (python -m utils.db_maintenance --enable-incremental-vacuum).
+        Возвращает число переведённых шардов.
+        """
+        converted = 0
+        for shard in self._shards:
+            try:
+                if await shard.pool.write(self._enable_incremental_vacuum):
+                    converted += 1
+            except Exception as e:
+                logging.error(f"Ошибка при включении auto_vacuum в шарде {shard.index}: {e}")
+        return converted
+
+    def _enable_incremental_vacuum(self, conn: sqlite3.Connection) -> bool:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+
+    async def checkpoint(self) -> None:
+        """Перенос WAL в основной файл и усечение WAL."""
+        try:
+            await asyncio.gather(*(shard.pool.write(self._checkpoint) for shard in self._shards))
+        except Exception as e:
+            logging.error(f"Ошибка при контрольной точке WAL: {e}")
+
+    def _checkpoint(self, conn: sqlite3.Connection):
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+
+    async def get_storage_stats(self) -> Dict[str, int]:
+        """Размеры файлов базы в байтах (сумма по шардам)."""
+        stats = {'db_bytes': 0, 'wal_bytes': 0, 'free_bytes': 0}
+        for shard in self._shards:
+            wal_path = shard.db_path.with_name(shard.db_path.name + '-wal')
+            try:
+                stats['db_bytes'] += shard.db_path.stat().st_size
+                if wal_path.exists():
+                    stats['wal_bytes'] += wal_path.stat().st_size
+                stats['free_bytes'] += await shard.pool.read(self._get_free_bytes)
+            except Exception as e:
+                logging.error(f"Ошибка при получении размера базы данных: {e}")
+        return stats
+
+    def _get_free_bytes(self, conn: sqlite3.Connection) -> int:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return page_size * conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+    async def probe_query_timings(self, repeats: int = 20) -> Dict[str, float]:
+        """Медианное время горячих запросов в миллисекундах.
+
+        Запросы выполняются на читателях для последнего пользователя
+        с раскладами в каждом шарде; по шардам берётся среднее.
+        """
+        try:
+            parts = await asyncio.gather(*(
+                shard.pool.read(self._probe_query_timings, shard.index == 0, repeats) for shard in self._shards
+            ))
+        except Exception as e:
+            logging.error(f"Ошибка при замере времени запросов: {e}")
+            return {}
+
+        timings: Dict[str, List[float]] = {}
+        for part in parts:
+            for name, value in part.items():
+                timings.setdefault(name, []).append(value)
+        return {name: sum(values) / len(values) for name, values in timings.items()}
+
+    def _probe_query_timings(self, conn: sqlite3.Connection, with_cards: bool, repeats: int) -> Dict[str, float]:
+        row = conn.execute('SELECT user_id FROM spreads ORDER BY id DESC LIMIT 1').fetchone()
+        user_id = row[0] if row else 0
+        probes = {
+            'get_user': (sql.GET_USER, (user_id,)),
+            'get_last_spread': (sql.GET_LAST_SPREAD, (user_id,)),
+            'get_user_spreads': (sql.GET_USER_SPREADS_FIRST, (user_id, 10)),
+            'get_daily_subscribers': (sql.GET_DAILY_SUBSCRIBERS_BATCH, (0, 1000)),
+        }
+        if with_cards:
+            card = conn.execute('SELECT name_en FROM cards LIMIT 1').fetchone()
+            if card:
+                probes['get_card'] = (sql.GET_CARD, card)
+
+        timings = {}
+        for name, (statement, params) in probes.items():
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(statement, params).fetchall()
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            timings[name] = samples[len(samples) // 2] * 1000
+        return timings
 
     async def get_stats(self) -> Dict:
         """Получение статистики использования бота."""
         try:
-            async with self._lock:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    stats = {}
-                    
-                    # Общее количество пользователей
-                    cursor.execute('SELECT COUNT(*) FROM users')
-                    stats['total_users'] = cursor.fetchone()[0]
-                    
-                    # Количество подписчиков на ежедневные предсказания
-                    cursor.execute('SELECT COUNT(*) FROM users WHERE daily_prediction = TRUE')
-                    stats['daily_subscribers'] = cursor.fetchone()[0]
-                    
-                    # Общее количество раскладов
-                    cursor.execute('SELECT COUNT(*) FROM spreads')
-                    stats['total_spreads'] = cursor.fetchone()[0]
-                    
-                    # Количество раскладов за последние 24 часа
-                    cursor.execute('''
-                        SELECT COUNT(*) FROM spreads 
-                        WHERE created_at >= datetime('now', '-1 day')
-                    ''')
-                    stats['spreads_last_24h'] = cursor.fetchone()[0]
-                    
-                    # Популярные темы раскладов
-                    cursor.execute('''
-                        SELECT theme, COUNT(*) as count 
-                        FROM spreads 
-                        GROUP BY theme 
-                        ORDER BY count DESC 
-                        LIMIT 5
-                    ''')
-                    stats['popular_themes'] = dict(cursor.fetchall())
-                    
-                    return stats
+            parts = await asyncio.gather(*(shard.pool.read(self._get_stats) for shard in self._shards))
         except Exception as e:
             logging.error(f"Ошибка при получении статистики: {e}")
-            return {} 
\ No newline at end of file
+            return {}
+
+        # Слияние статистики шардов
+        stats = {'total_users': 0, 'daily_subscribers': 0, 'total_spreads': 0, 'spreads_last_24h': 0}
+        spreads_per_day: Dict[str, int] = {}
+        themes: Dict[str, int] = {}
+        for part in parts:
+            for key in stats:
+                stats[key] += part[key]
+            for day, count in part['spreads_per_day'].items():
+                spreads_per_day[day] = spreads_per_day.get(day, 0) + count
+            for theme, count in part['theme_counts'].items():
+                themes[theme] = themes.get(theme, 0) + count
+        stats['spreads_per_day'] = dict(sorted(spreads_per_day.items()))
+        # Популярные темы раскладов
+        stats['popular_themes'] = dict(heapq.nlargest(5, themes.items(), key=lambda item: item[1]))
+        return stats
+
+    def _get_stats(self, conn: sqlite3.Connection) -> Dict:
+        cursor = conn.cursor()
+        stats = {}
+
+        # Общие счетчики: пользователи, подписчики, расклады
+        cursor.execute('SELECT name, value FROM counters')
+        counters = dict(cursor.fetchall())
+        stats['total_users'] = counters.get('total_users', 0)
+        stats['daily_subscribers'] = counters.get('daily_subscribers', 0)
+        stats['total_spreads'] = counters.get('total_spreads', 0)
+
+        # Количество раскладов за последние 24 часа (с точностью до часа)
+        cursor.execute('''
+            SELECT COALESCE(SUM(count), 0) FROM spread_counts
+            WHERE bucket > strftime('%Y-%m-%d %H', 'now', '-1 day')
+        ''')
+        stats['spreads_last_24h'] = cursor.fetchone()[0]
+
+        # Количество раскладов по дням за последнюю неделю
+        cursor.execute('''
+            SELECT substr(bucket, 1, 10) AS day, SUM(count)
+            FROM spread_counts
+            WHERE bucket >= strftime('%Y-%m-%d', 'now', '-6 days')
+            GROUP BY day
+            ORDER BY day
+        ''')
+        stats['spreads_per_day'] = dict(cursor.fetchall())
+
+        # Все темы: популярные выбираются после слияния шардов
+        cursor.execute('SELECT theme, count FROM theme_counts')
+        stats['theme_counts'] = dict(cursor.fetchall())
+
+        return stats
+
+    def close(self) -> None:
+        """Синхронный сброс очереди записи и закрытие соединений с базой данных."""
+        for shard in self._shards:
+            shard.close()
@@ -0,0 +1,152 @@
+import asyncio
+import gzip
+import logging
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_KEEP, BACKUP_COMPRESS
+from .database import Database
+
+class DatabaseBackup:
+    """Онлайн-резервное копирование tarot.db без остановки бота.
+
+    Копия снимается через backup API SQLite за один шаг в отдельном потоке,
+    поэтому event loop не блокируется. База работает в режиме WAL: снимок
+    читается из одной транзакции чтения и не мешает писателю, а записи,
+    сделанные во время копирования, не перезапускают копию.
+    Готовые снимки при необходимости сжимаются gzip и ротируются.
+    В режиме шардирования снимок снимается с каждого файла шарда.
+    """
+
+    def __init__(self, backup_dir: str = BACKUP_DIR, keep: int = BACKUP_KEEP,
+                 compress: bool = BACKUP_COMPRESS, interval: float = BACKUP_INTERVAL_HOURS * 3600):
+        self.db_paths = Database().shard_paths
+        self.backup_dir = Path(backup_dir)
+        self.keep = keep
+        self.compress = compress
+        self._interval = interval
+        self._stats = {
+            "backups": 0,
+            "failures": 0,
+            "last_backup_at": None,
+            "last_backup_paths": [],
+            "last_duration": 0.0,
+            "last_copy_duration": 0.0,
+            "last_pages": 0,
+            "last_size": 0,
+            "last_compressed_size": 0
+        }
+
+    def _progress(self, status: int, remaining: int, total: int) -> None:
+        """Вызывается по завершении копирования."""
+        self._stats["last_pages"] = total
+
+    def _backup_file(self, db_path: Path, target: Path) -> Path:
+        """Снятие снимка одного файла и сжатие; выполняется в отдельном потоке."""
+        source = sqlite3.connect(db_path)
+        destination = sqlite3.connect(target)
+        try:
+            # Копирование порциями перезапускалось бы после каждой записи
+            # очереди write-behind; один шаг читает базу из одного снимка
+            source.backup(destination, pages=-1, progress=self._progress)
+        finally:
+            destination.close()
+            source.close()
+        self._stats["last_size"] += target.stat().st_size
+
+        if not self.compress:
+            self._stats["last_compressed_size"] += target.stat().st_size
+            return target
+
+        compressed = target.with_name(target.name + '.gz')
+        with open(target, 'rb') as src, gzip.open(compressed, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+        target.unlink()
+        self._stats["last_compressed_size"] += compressed.stat().st_size
+        return compressed
+
+    def _backup_sync(self, targets: List[Path]) -> List[Path]:
+        """Снятие снимков всех файлов базы."""
+        copy_start = time.perf_counter()
+        self._stats["last_size"] = 0
+        self._stats["last_compressed_size"] = 0
+        paths = [self._backup_file(db_path, target) for db_path, target in zip(self.db_paths, targets)]
+        self._stats["last_copy_duration"] = time.perf_counter() - copy_start
+        return paths
+
+    def _rotate(self) -> None:
+        """Удаление самых старых снимков сверх лимита keep."""
+        for db_path in self.db_paths:
+            snapshots = sorted(self.backup_dir.glob(f'{db_path.stem}-[0-9]*.db*'))
+            for old in snapshots[:-self.keep] if self.keep > 0 else []:
+                try:
+                    old.unlink()
+                except OSError as e:
+                    logging.warning(f"Не удалось удалить старую резервную копию {old}: {e}")
+
+    async def backup_once(self) -> Optional[List[Path]]:
+        """Снятие одного снимка базы данных (по файлу на шард)."""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        targets = [self.backup_dir / f"{db_path.stem}-{timestamp}.db" for db_path in self.db_paths]
+        # Файлы, которые может оставить неудачная попытка (.db и недописанный .gz);
+        # снимки с тем же именем, снятые раньше, при ошибке не трогаются
+        partial = [
+            path for target in targets for path in (target, target.with_name(target.name + '.gz'))
+            if not path.exists()
+        ]
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            paths = await loop.run_in_executor(None, self._backup_sync, targets)
+            await loop.run_in_executor(None, self._rotate)
+        except Exception as e:
+            self._stats["failures"] += 1
+            logging.error(f"Ошибка при резервном копировании базы данных: {e}")
+            # Недописанный .gz иначе попал бы в ротацию как целый снимок
+            for path in partial:
+                path.unlink(missing_ok=True)
+            return None
+
+        duration = time.perf_counter() - start_time
+        self._stats["backups"] += 1
+        self._stats["last_backup_at"] = datetime.now().isoformat()
+        self._stats["last_backup_paths"] = [str(path) for path in paths]
+        self._stats["last_duration"] = duration
+        logging.info(
+            f"Резервная копия базы данных: {', '.join(map(str, paths))} "
+            f"({self._stats['last_size'] / 1024:.0f} КБ -> {self._stats['last_compressed_size'] / 1024:.0f} КБ, "
+            f"{duration:.1f} с)"
+        )
+        return paths
+
+    def _seconds_until_due(self) -> float:
+        """Время до следующего снимка, считая от самого нового снимка на диске.
+
+        Перезапуск бота не вызывает внеочередного полного копирования.
+        """
+        mtimes = []
+        for db_path in self.db_paths:
+            for snapshot in self.backup_dir.glob(f'{db_path.stem}-[0-9]*.db*'):
+                try:
+                    mtimes.append(snapshot.stat().st_mtime)
+                except OSError:
+                    pass
+        if not mtimes:
+            return 0.0
+        return max(0.0, max(mtimes) + self._interval - time.time())
+
+    async def run(self) -> None:
+        """Периодическое резервное копирование."""
+        while True:
+            await asyncio.sleep(self._seconds_until_due())
+            if await self.backup_once() is None:
+                # Неудачная попытка не оставила снимка: повтор не раньше чем через интервал
+                await asyncio.sleep(self._interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики резервного копирования: время и размеры снимков."""
+        return dict(self._stats)
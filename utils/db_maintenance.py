@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from config import DB_MAINTENANCE_HOUR, DB_VACUUM_PAGES
+from .database import Database
+
+class DatabaseMaintenance:
+    """Ежедневное обслуживание базы в час наименьшей нагрузки.
+
+    Проход обновляет статистику планировщика (ANALYZE по одной таблице
+    и PRAGMA optimize), возвращает свободные страницы порциями
+    incremental_vacuum и усекает WAL. Между порциями задача уступает
+    event loop и очередь записи. До и после прохода в лог пишутся размер
+    файлов и время горячих запросов.
+
+    Файлы, созданные без auto_vacuum = INCREMENTAL, проход не трогает:
+    перевод требует полного VACUUM и выполняется вручную командой
+    python -m utils.db_maintenance --enable-incremental-vacuum.
+    """
+
+    def __init__(self, hour: int = DB_MAINTENANCE_HOUR, vacuum_pages: int = DB_VACUUM_PAGES,
+                 analysis_limit: int = 1000, pause: float = 0.05):
+        self.db = Database()
+        self.hour = hour
+        self.vacuum_pages = vacuum_pages
+        self.analysis_limit = analysis_limit
+        self._pause = pause
+        self._stats = {
+            "runs": 0,
+            "last_run_duration": 0.0,
+            "last_tables_analyzed": 0,
+            "last_pages_freed": 0,
+            "last_size_before": {},
+            "last_size_after": {},
+            "last_timings_before": {},
+            "last_timings_after": {}
+        }
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Один проход обслуживания всех шардов."""
+        start_time = time.perf_counter()
+        size_before = await self.db.get_storage_stats()
+        timings_before = await self.db.probe_query_timings()
+
+        tables = 0
+        async for _ in self.db.analyze(self.analysis_limit):
+            tables += 1
+            await asyncio.sleep(self._pause)
+
+        pages_freed = 0
+        while True:
+            count = await self.db.incremental_vacuum(self.vacuum_pages)
+            if not count:
+                break
+            pages_freed += count
+            # Даем пройти обработчикам и очереди записи между порциями
+            await asyncio.sleep(self._pause)
+
+        await self.db.checkpoint()
+        size_after = await self.db.get_storage_stats()
+        timings_after = await self.db.probe_query_timings()
+
+        duration = time.perf_counter() - start_time
+        self._stats["runs"] += 1
+        self._stats["last_run_duration"] = duration
+        self._stats["last_tables_analyzed"] = tables
+        self._stats["last_pages_freed"] = pages_freed
+        self._stats["last_size_before"] = size_before
+        self._stats["last_size_after"] = size_after
+        self._stats["last_timings_before"] = timings_before
+        self._stats["last_timings_after"] = timings_after
+
+        timings = ', '.join(
+            f"{name} {timings_before.get(name, 0):.3f}→{value:.3f} мс" for name, value in timings_after.items()
+        )
+        logging.info(
+            f"Обслуживание базы данных за {duration:.1f} с: таблиц {tables}, освобождено страниц {pages_freed}; "
+            f"файл {size_before['db_bytes']}→{size_after['db_bytes']} байт, "
+            f"WAL {size_before['wal_bytes']}→{size_after['wal_bytes']} байт, "
+            f"свободно {size_before['free_bytes']}→{size_after['free_bytes']} байт; {timings}"
+        )
+        return dict(self._stats)
+
+    def _seconds_until_window(self) -> float:
+        now = datetime.now()
+        target = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    async def run(self) -> None:
+        """Ежедневный запуск обслуживания в час DB_MAINTENANCE_HOUR."""
+        while True:
+            await asyncio.sleep(self._seconds_until_window())
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Ошибка при обслуживании базы данных: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика обслуживания: размеры и время запросов до и после."""
+        return dict(self._stats, hour=self.hour)
+
+async def _enable_incremental_vacuum() -> int:
+    db = Database()
+    try:
+        return await db.enable_incremental_vacuum()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание базы бота")
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help="перевести старые файлы в auto_vacuum = INCREMENTAL полным VACUUM "
+                             "(перестраивает файлы, нужен двойной запас места; запускать при остановленном боте)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.enable_incremental_vacuum:
+        converted = asyncio.run(_enable_incremental_vacuum())
+        print(f"Переведено шардов: {converted}")
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+from config import SPREAD_RETENTION_DAYS, SPREAD_RETENTION_BATCH
+from .database import Database
+
+class SpreadRetention:
+    """Фоновая свертка и удаление раскладов старше срока хранения.
+
+    Старые расклады сворачиваются в таблицу spread_rollup (счетчики по дням
+    для пользователей, тем и карт) и удаляются небольшими пачками. Между
+    пачками задача уступает event loop и очередь записи, поэтому длинных
+    блокировок на запись нет.
+    """
+
+    def __init__(self, retention_days: int = SPREAD_RETENTION_DAYS,
+                 batch_size: int = SPREAD_RETENTION_BATCH,
+                 pause: float = 0.05, interval: int = 6 * 3600):
+        self.db = Database()
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self._pause = pause
+        self._interval = interval
+        self._stats = {
+            "runs": 0,
+            "rows_removed": 0,
+            "last_run_rows": 0,
+            "last_run_duration": 0.0
+        }
+
+    async def run_once(self) -> int:
+        """Один проход: свертка всех раскладов старше срока хранения."""
+        if self.retention_days <= 0:
+            return 0
+
+        cutoff = int(time.time()) - self.retention_days * 86400
+        start_time = time.perf_counter()
+        removed = 0
+        while True:
+            count = await self.db.rollup_old_spreads(cutoff, self.batch_size)
+            if not count:
+                break
+            removed += count
+            # Даем пройти обработчикам и очереди записи между пачками
+            await asyncio.sleep(self._pause)
+
+        duration = time.perf_counter() - start_time
+        self._stats["runs"] += 1
+        self._stats["rows_removed"] += removed
+        self._stats["last_run_rows"] = removed
+        self._stats["last_run_duration"] = duration
+        if removed:
+            logging.info(f"Свернуто и удалено старых раскладов: {removed} за {duration:.1f} с")
+        return removed
+
+    async def run(self) -> None:
+        """Периодический запуск свертки."""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Ошибка при свертке старых раскладов: {e}")
+            await asyncio.sleep(self._interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика работы задачи хранения."""
+        return dict(self._stats, retention_days=self.retention_days)
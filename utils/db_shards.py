@@ -0,0 +1,63 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from .db_pool import ConnectionPool
+from .write_queue import WriteBehindQueue
+from .spread_codec import SpreadCodec
+from .db_statements import STATEMENT_CACHE_SIZE
+
+def shard_index(user_id: int, shards: int) -> int:
+    """Номер шарда пользователя.
+
+    Используется blake2b, а не hash(): результат не зависит от процесса
+    и версии Python, поэтому пользователь всегда попадает в тот же файл.
+    """
+    if shards <= 1:
+        return 0
+    digest = hashlib.blake2b(int(user_id).to_bytes(8, 'big', signed=True), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+def shard_paths(db_path: Path, shards: int) -> List[Path]:
+    """Пути файлов шардов.
+
+    Без шардирования это сам db_path. Число шардов входит в имя файла,
+    чтобы база не открылась с другим DB_SHARDS и неверной маршрутизацией.
+    """
+    db_path = Path(db_path)
+    if shards <= 1:
+        return [db_path]
+    return [db_path.parent / 'shards' / f'{db_path.stem}_shard{i}_of_{shards}{db_path.suffix}'
+            for i in range(shards)]
+
+class DatabaseShard:
+    """Один файл базы: пул соединений, словари кодов и очередь записи.
+
+    Словари card_dict и theme_dict у каждого шарда свои, поэтому коды
+    в раскладах имеют смысл только внутри своего файла.
+    """
+
+    def __init__(self, index: int, db_path: Path,
+                 apply_batch: Callable[[sqlite3.Connection, SpreadCodec, Dict[int, Dict[str, Any]], List[tuple]], Any],
+                 flush_interval: float, max_batch: int, profile: str = 'throughput'):
+        self.index = index
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(self.db_path, cached_statements=STATEMENT_CACHE_SIZE, profile=profile)
+        self.codec = SpreadCodec()
+        self._apply = apply_batch
+        self.write_queue = WriteBehindQueue(
+            self.pool,
+            self._apply_batch,
+            flush_interval=flush_interval,
+            max_batch=max_batch
+        )
+
+    def _apply_batch(self, conn: sqlite3.Connection, users: Dict[int, Dict[str, Any]], spreads: List[tuple]):
+        return self._apply(conn, self.codec, users, spreads)
+
+    def close(self) -> None:
+        """Синхронный сброс очереди записи и закрытие соединений."""
+        self.write_queue.stop()
+        self.write_queue.flush_sync()
+        self.pool.close()
@@ -0,0 +1,154 @@
+"""Разбиение data/tarot.db на шарды по user_id.
+
+Запуск (бот должен быть остановлен):
+
+    python -m utils.db_split --shards 4
+
+Исходный файл не меняется. Шарды создаются во временных файлах и
+переименовываются только после успешного копирования, затем в .env
+нужно указать DB_SHARDS с тем же числом шардов.
+"""
+import argparse
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List
+from .database import Database, SCHEMA_VERSION
+from .db_shards import shard_index, shard_paths
+
+# Таблицы, которые целиком копируются в каждый шард: коды раскладов
+# ссылаются на словари своего файла
+DICT_TABLES = ('card_dict', 'theme_dict')
+
+# Глобальные счетчики: всё, что не восстановили триггеры при копировании
+# (например, удаленные задачей хранения расклады), добавляется в первый шард
+COUNTER_TABLES = (('counters', 'name', 'value'), ('spread_counts', 'bucket', 'count'), ('theme_counts', 'theme', 'count'))
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+def _insert_sql(table: str, columns: List[str]) -> str:
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+def _copy_routed(source: sqlite3.Connection, targets: List[sqlite3.Connection], table: str,
+                 key: str, route_column: str, batch_size: int) -> int:
+    """Копирование таблицы пачками по возрастанию key с маршрутизацией по user_id."""
+    columns = _columns(source, table)
+    route = columns.index(route_column)
+    position = columns.index(key)
+    sql = _insert_sql(table, columns)
+    copied = 0
+    last = None
+    while True:
+        if last is None:
+            rows = source.execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY {key} LIMIT ?',
+                                  (batch_size,)).fetchall()
+        else:
+            rows = source.execute(f'SELECT {", ".join(columns)} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?',
+                                  (last, batch_size)).fetchall()
+        if not rows:
+            return copied
+        routed: Dict[int, List[tuple]] = {}
+        for row in rows:
+            routed.setdefault(shard_index(row[route], len(targets)), []).append(row)
+        for index, params in routed.items():
+            targets[index].executemany(sql, params)
+        copied += len(rows)
+        last = rows[-1][position]
+        logging.info(f"{table}: скопировано {copied}")
+
+def _copy_all(source: sqlite3.Connection, target: sqlite3.Connection, table: str, where: str = '') -> None:
+    columns = _columns(source, table)
+    rows = source.execute(f'SELECT {", ".join(columns)} FROM {table} {where}').fetchall()
+    target.executemany(_insert_sql(table, columns), rows)
+
+def _group_rollup(source: sqlite3.Connection, shards: int) -> Dict[int, List[tuple]]:
+    grouped: Dict[int, List[tuple]] = {}
+    for row in source.execute("SELECT day, dimension, key, count FROM spread_rollup WHERE dimension = 'user'"):
+        grouped.setdefault(shard_index(row[2], shards), []).append(row)
+    return grouped
+
+def _restore_counters(source: sqlite3.Connection, targets: List[sqlite3.Connection]) -> None:
+    """Досчет глобальных счетчиков в первом шарде до значений исходной базы."""
+    for table, key, value in COUNTER_TABLES:
+        expected = dict(source.execute(f'SELECT {key}, {value} FROM {table}'))
+        for target in targets:
+            for name, count in target.execute(f'SELECT {key}, {value} FROM {table}'):
+                expected[name] = expected.get(name, 0) - count
+        targets[0].executemany(f'''
+            INSERT INTO {table} ({key}, {value}) VALUES (?, ?)
+            ON CONFLICT({key}) DO UPDATE SET {value} = {value} + excluded.{value}
+        ''', [(name, count) for name, count in expected.items() if count])
+
+def split_database(source_path: Path, shards: int, batch_size: int = 5000) -> List[Path]:
+    """Создание шардов из одного файла базы."""
+    if shards < 2:
+        raise ValueError("Число шардов должно быть не меньше 2")
+    paths = shard_paths(source_path, shards)
+    existing = [path for path in paths if path.exists()]
+    if existing:
+        raise FileExistsError(f"Шарды уже существуют: {', '.join(map(str, existing))}")
+
+    source = sqlite3.connect(source_path)
+    if source.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        raise RuntimeError("Схема исходной базы устарела: запустите бот один раз без шардирования")
+
+    start_time = time.perf_counter()
+    temporary = [path.with_name(path.name + '.tmp') for path in paths]
+    targets = []
+    try:
+        for path in temporary:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.unlink(missing_ok=True)
+            target = sqlite3.connect(path)
+            # auto_vacuum задаётся до перехода в WAL, который инициализирует файл
+            target.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            target.execute('PRAGMA journal_mode=WAL')
+            Database._create_schema(target)
+            targets.append(target)
+
+        for target in targets:
+            for table in DICT_TABLES:
+                _copy_all(source, target, table)
+        _copy_all(source, targets[0], 'cards')
+        # Дневные агрегаты по пользователям — в шард пользователя, остальные — в первый
+        for index, rows in _group_rollup(source, shards).items():
+            targets[index].executemany(_insert_sql('spread_rollup', ['day', 'dimension', 'key', 'count']), rows)
+        _copy_all(source, targets[0], 'spread_rollup', "WHERE dimension != 'user'")
+
+        users = _copy_routed(source, targets, 'users', 'user_id', 'user_id', batch_size)
+        spreads = _copy_routed(source, targets, 'spreads', 'id', 'user_id', batch_size)
+        _restore_counters(source, targets)
+
+        for target in targets:
+            target.commit()
+            target.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            target.close()
+        targets = []
+        for tmp, path in zip(temporary, paths):
+            tmp.rename(path)
+    finally:
+        for target in targets:
+            target.close()
+        source.close()
+
+    logging.info(
+        f"База {source_path} разбита на {shards} шардов за {time.perf_counter() - start_time:.1f} с: "
+        f"пользователей {users}, раскладов {spreads}"
+    )
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбиение базы бота на шарды по user_id")
+    parser.add_argument('--shards', type=int, required=True, help="число шардов (значение DB_SHARDS)")
+    parser.add_argument('--source', default='data/tarot.db', help="исходный файл базы")
+    parser.add_argument('--batch-size', type=int, default=5000, help="строк в одной пачке копирования")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for path in split_database(Path(args.source), args.shards, args.batch_size):
+        print(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Горячие SQL-запросы Database.
+
+sqlite3 кэширует подготовленные запросы в каждом соединении по точному
+тексту SQL. Горячие запросы собраны здесь константами, поэтому текст
+у них всегда один и тот же: запрос разбирается при первом выполнении
+в соединении, а затем берётся из кэша. Размер кэша соединений
+(STATEMENT_CACHE_SIZE) рассчитан так, чтобы эти запросы и варианты
+UPSERT из _upsert_users_sql не вытесняли друг друга.
+"""
+
+GET_USER = '''
+    SELECT user_id, spreads_today, last_spread_date, theme, show_images, daily_prediction
+    FROM users
+    WHERE user_id = ?
+'''
+
+RESERVE_SPREAD = '''
+    INSERT INTO users (user_id, spreads_today, last_spread_date)
+    VALUES (:user_id, 1, :today)
+    ON CONFLICT(user_id) DO UPDATE SET
+        spreads_today = CASE
+            WHEN users.last_spread_date = :today THEN users.spreads_today + 1
+            ELSE 1
+        END,
+        last_spread_date = :today
+    WHERE users.last_spread_date IS NOT :today OR users.spreads_today < :limit
+    RETURNING user_id, spreads_today, last_spread_date, theme, show_images, daily_prediction
+'''
+
+GET_CARD = 'SELECT * FROM cards WHERE name_en = ?'
+
+# Покрывающий индекс idx_users_daily_prediction (daily_prediction, rowid)
+GET_DAILY_SUBSCRIBERS_BATCH = '''
+    SELECT user_id FROM users
+    WHERE daily_prediction = TRUE AND user_id > ?
+    ORDER BY user_id
+    LIMIT ?
+'''
+
+INSERT_SPREAD = '''
+    INSERT INTO spreads (user_id, theme, cards)
+    VALUES (?, ?, ?)
+'''
+
+INSERT_SPREAD_AT = '''
+    INSERT INTO spreads (user_id, theme, cards, created_at)
+    VALUES (?, ?, ?, ?)
+'''
+
+GET_LAST_SPREAD = '''
+    SELECT theme, cards, datetime(created_at, 'unixepoch')
+    FROM spreads
+    WHERE user_id = ?
+    ORDER BY created_at DESC
+    LIMIT 1
+'''
+
+# Keyset-пагинация по индексу idx_spreads_user_date (user_id, created_at, rowid)
+GET_USER_SPREADS_FIRST = '''
+    SELECT theme, cards, datetime(created_at, 'unixepoch'), created_at, id
+    FROM spreads
+    WHERE user_id = ?
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+
+GET_USER_SPREADS_AFTER = '''
+    SELECT theme, cards, datetime(created_at, 'unixepoch'), created_at, id
+    FROM spreads
+    WHERE user_id = ? AND (created_at, id) < (?, ?)
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+
+# Запросы модуля + до 64 вариантов UPSERT пользователей + запас на редкие запросы
+STATEMENT_CACHE_SIZE = 256
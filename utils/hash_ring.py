@@ -0,0 +1,86 @@
+import bisect
+import hashlib
+from typing import Dict, List, Optional
+
+def ring_hash(value: str) -> int:
+    """Стабильный 64-битный хэш строки.
+
+    blake2b, а не hash(): встроенный hash для строк солится в каждом
+    процессе, и узлы кластера по-разному определяли бы владельца ключа.
+    """
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """Кольцо консистентного хэширования с виртуальными узлами.
+
+    Каждый узел занимает vnodes точек на кольце; ключ принадлежит узлу
+    первой точки по часовой стрелке от хэша ключа. При добавлении или
+    удалении узла меняют владельца только ключи его точек — около 1/N
+    всех ключей. Поиск владельца — двоичный поиск, O(log(N * vnodes)).
+    """
+
+    def __init__(self, vnodes: int = 160):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: Dict[str, List[int]] = {}
+        # Растет при каждом изменении состава узлов
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._nodes
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add(self, node_id: str) -> bool:
+        """Добавление узла; False, если он уже на кольце."""
+        if node_id in self._nodes:
+            return False
+        points = [ring_hash(f"{node_id}#{i}") for i in range(self.vnodes)]
+        self._nodes[node_id] = points
+        for point in points:
+            index = bisect.bisect_left(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node_id)
+        self.version += 1
+        return True
+
+    def remove(self, node_id: str) -> bool:
+        """Удаление узла; False, если его не было на кольце."""
+        if self._nodes.pop(node_id, None) is None:
+            return False
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node_id]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+        self.version += 1
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        """Узел-владелец ключа; None для пустого кольца."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, ring_hash(key))
+        return self._owners[index % len(self._points)]
+
+    def get_nodes(self, key: str, count: int) -> List[str]:
+        """До count различных узлов по часовой стрелке от ключа.
+
+        Первый — владелец ключа, следующие — кандидаты для реплик.
+        """
+        if not self._points:
+            return []
+        count = min(count, len(self._nodes))
+        result: List[str] = []
+        index = bisect.bisect(self._points, ring_hash(key))
+        for offset in range(len(self._points)):
+            owner = self._owners[(index + offset) % len(self._points)]
+            if owner not in result:
+                result.append(owner)
+                if len(result) == count:
+                    break
+        return result
@@ -0,0 +1,56 @@
+import heapq
+import time
+from collections import Counter
+from operator import itemgetter
+from typing import Set, Tuple
+
+class HotKeyTracker:
+    """Счетчики обращений к ключам кэша по окнам времени.
+
+    Каждое чтение увеличивает счетчик ключа; по окончании окна ключи,
+    прочитанные не меньше threshold раз, считаются горячими (не больше
+    max_keys самых читаемых). Горячий ключ остается горячим, пока число
+    чтений за окно не опустится ниже cool_threshold: после репликации
+    часть чтений уходит на реплики, и без гистерезиса ключ охлаждался бы
+    сразу после того, как его скопировали. Счетчики живут одно окно,
+    поэтому память ограничена числом различных ключей за окно.
+    """
+
+    def __init__(self, threshold: int, cool_threshold: int, window: float, max_keys: int):
+        self.threshold = threshold
+        self.cool_threshold = cool_threshold
+        self.window = window
+        self.max_keys = max_keys
+        self.hot: Set[str] = set()
+        self._counts: Counter = Counter()
+        self._window_start = time.monotonic()
+
+    def record(self, key: str, count: int = 1) -> bool:
+        """Учет count чтений ключа; True, если окно закончилось и пора вызвать rotate."""
+        self._counts[key] += count
+        return time.monotonic() - self._window_start >= self.window
+
+    def rotate(self) -> Tuple[Set[str], Set[str]]:
+        """Закрытие окна: (горячие ключи, ключи, переставшие быть горячими).
+
+        Если окно затянулось (чтений не было), счетчики приводятся к
+        длине окна, чтобы редкие чтения за долгое время не накопились
+        в горячий ключ.
+        """
+        now = time.monotonic()
+        scale = self.window / max(now - self._window_start, self.window)
+        candidates = [
+            (key, count * scale) for key, count in self._counts.items()
+            if count * scale >= (self.cool_threshold if key in self.hot else self.threshold)
+        ]
+        hot = {key for key, _ in heapq.nlargest(self.max_keys, candidates, key=itemgetter(1))}
+        cooled = self.hot - hot
+        self.hot = hot
+        self._counts.clear()
+        self._window_start = now
+        return hot, cooled
+
+    def clear(self) -> None:
+        self.hot.clear()
+        self._counts.clear()
+        self._window_start = time.monotonic()
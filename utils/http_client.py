@@ -0,0 +1,49 @@
+import logging
+from typing import Optional
+import aiohttp
+from config import HTTP_LIMIT_PER_HOST, HTTP_TIMEOUT, HTTP_KEEPALIVE_TIMEOUT
+
+class HttpClient:
+    """Общий HTTP-клиент процесса для обмена между узлами кластера.
+
+    Одна aiohttp.ClientSession с пулом keep-alive соединений на все
+    запросы кэша, регистрации и heartbeat: без нового TCP-соединения на
+    каждый вызов. Сессия создаётся при первом обращении (нужен запущенный
+    event loop) и закрывается в BotManager.on_shutdown.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HttpClient, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self._session: Optional[aiohttp.ClientSession] = None
+            self._initialized = True
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Общая сессия; пересоздаётся, если была закрыта."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=HTTP_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Закрытие сессии и всех соединений пула."""
+        if self._session is not None and not self._session.closed:
+            try:
+                await self._session.close()
+            except Exception as e:
+                logging.error(f"Ошибка при закрытии HTTP-клиента: {e}")
+        self._session = None
@@ -6,6 +6,7 @@ import asyncio
 import aiofiles
 import logging
 from config import IMAGES_PATH
+from .memory_pressure import MemoryPressure
 import time
 from pathlib import Path
 
@@ -24,6 +25,8 @@ class ImageManager:
             self._cache = {}
             self._cache_lifetime = 3600  # 1 час
             self._max_cache_size = 100
+            self._pressure = MemoryPressure()
+            self._pressure.add_listener(lambda level: self._evict())
             self._last_cleanup = time.time()
             self._cleanup_interval = 3600  # 1 час
             self._cleanup_task = None
@@ -49,11 +52,22 @@ class ImageManager:
             
         image_data = await self._optimize_image(image_name)
         if image_data:
+            # Перезапись переносит изображение в конец: в начале самые старые
+            self._cache.pop(image_name, None)
             self._cache[image_name] = (time.time(), image_data)
-            if len(self._cache) > self._max_cache_size:
-                await self._cleanup_cache()
+            self._evict()
         return image_data
 
+    def _cache_budget(self) -> int:
+        """Размер кэша с учётом давления на память."""
+        return max(int(self._max_cache_size * self._pressure.budget_factor), 1)
+
+    def _evict(self) -> None:
+        """Удаление самых старых изображений сверх бюджета."""
+        budget = self._cache_budget()
+        while len(self._cache) > budget:
+            del self._cache[next(iter(self._cache))]
+
     async def _optimize_image(self, image_path: str) -> Optional[bytes]:
         try:
             base_name = os.path.basename(image_path)
@@ -126,6 +140,7 @@ class ImageManager:
         return {
             "cache_size": len(self._cache),
             "max_cache_size": self._max_cache_size,
+            "cache_budget": self._cache_budget(),
             "cache_lifetime": self._cache_lifetime,
             "cached_images": list(self._cache.keys())
         } 
\ No newline at end of file
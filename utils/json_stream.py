@@ -0,0 +1,104 @@
+import codecs
+import json
+import re
+from pathlib import Path
+from typing import Any, Iterator, Optional, Tuple, Union
+
+# Начало объекта, ключ с двоеточием и разделитель пар; пробелы
+# пропускаются регулярными выражениями, как в модуле json
+_OPEN = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*(\}?)')
+_KEY = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+_SEPARATOR = re.compile(r'[ \t\n\r]*([,}])')
+
+def iter_json_object(path: Union[str, Path], start: int = 0,
+                     chunk_size: int = 64 * 1024) -> Iterator[Tuple[str, Any, int]]:
+    """Потоковое чтение верхнего уровня JSON-объекта {"ключ": значение, ...}.
+
+    Файл читается кусками по chunk_size байт, каждое значение разбирается
+    json.JSONDecoder.raw_decode, поэтому в памяти одновременно находится
+    только одна пара. Для каждой пары выдаётся (ключ, значение, offset),
+    где offset — позиция в байтах сразу после значения. Переданный обратно
+    как start, он продолжает чтение со следующей пары.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        buffer = ''
+        position = 0
+        # Символы buffer[:counted] уже учтены в offset
+        counted = 0
+        offset = start
+        ascii_buffer = True
+        eof = False
+
+        def advance(to: int) -> None:
+            """Учёт байтового смещения разобранной части буфера."""
+            nonlocal counted, offset
+            # isascii() проверяет флаг строки без прохода по ней:
+            # для ASCII-буфера байты совпадают с символами
+            if ascii_buffer:
+                offset += to - counted
+            else:
+                offset += len(buffer[counted:to].encode('utf-8'))
+            counted = to
+
+        def read_more() -> bool:
+            """Дочитывание файла; разобранная часть буфера отбрасывается."""
+            nonlocal buffer, position, counted, ascii_buffer, eof
+            if eof:
+                return False
+            data = f.read(chunk_size)
+            eof = not data
+            advance(position)
+            buffer = buffer[position:] + utf8.decode(data, final=eof)
+            ascii_buffer = buffer.isascii()
+            position = counted = 0
+            return True
+
+        def match(pattern: re.Pattern) -> Optional[re.Match]:
+            while True:
+                found = pattern.match(buffer, position)
+                if found and (found.end() < len(buffer) or eof):
+                    return found
+                if not read_more():
+                    return found
+
+        if start == 0:
+            found = match(_OPEN)
+            if found is None:
+                raise ValueError(f"Ожидался JSON-объект в {path}")
+            position = found.end()
+            if found.group(1):
+                return
+        else:
+            # Продолжение после пары: дальше идёт ',' или закрывающая '}'
+            found = match(_SEPARATOR)
+            if found is None or found.group(1) == '}':
+                return
+            position = found.end()
+
+        while True:
+            # Пара разбирается целиком; если она не поместилась в буфер,
+            # файл дочитывается и разбор повторяется с её начала
+            while True:
+                key_match = _KEY.match(buffer, position)
+                if key_match and key_match.end() < len(buffer):
+                    try:
+                        value, end = decoder.raw_decode(buffer, key_match.end())
+                        separator = _SEPARATOR.match(buffer, end)
+                        if separator:
+                            break
+                    except json.JSONDecodeError:
+                        pass
+                if not read_more():
+                    raise ValueError(f"Неполный или повреждённый JSON в {path} после байта {offset}")
+
+            key = key_match.group(1)
+            if '\\' in key:
+                key = json.loads(f'"{key}"')
+            advance(end)
+            position = separator.end()
+            yield key, value, offset
+            if separator.group(1) == '}':
+                return
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import psutil
+from config import MEMORY_SAMPLE_INTERVAL, MEMORY_PRESSURE_HIGH, MEMORY_PRESSURE_CRITICAL
+
+# Уровни давления на память
+PRESSURE_NORMAL = 0
+PRESSURE_HIGH = 1
+PRESSURE_CRITICAL = 2
+
+# Доля обычного бюджета кэшей на каждом уровне
+BUDGET_FACTORS = {
+    PRESSURE_NORMAL: 1.0,
+    PRESSURE_HIGH: 0.5,
+    PRESSURE_CRITICAL: 0.25,
+}
+
+_CGROUP_ROOT = Path('/sys/fs/cgroup')
+
+# Значения больше этого в cgroup v1 означают «без лимита»
+_CGROUP_V1_UNLIMITED = 1 << 60
+
+def _read_int(path: Path) -> Optional[int]:
+    try:
+        value = path.read_text().strip()
+    except OSError:
+        return None
+    if not value or value == 'max':
+        return None
+    return int(value)
+
+def _read_stat(path: Path, name: str) -> int:
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(' ')
+                if key == name:
+                    return int(value)
+    except OSError:
+        pass
+    return 0
+
+def read_memory_usage() -> Tuple[int, int, str]:
+    """Использование и лимит памяти: (usage, limit, источник).
+
+    Сначала читается cgroup v2, затем v1 — это лимит контейнера
+    (memory: 512M в docker-compose.yml). Из использования вычитается
+    неактивный файловый кэш, который ядро отдаст без OOM. Без лимита
+    cgroup берётся память хоста.
+    """
+    limit = _read_int(_CGROUP_ROOT / 'memory.max')
+    if limit is not None:
+        usage = _read_int(_CGROUP_ROOT / 'memory.current') or 0
+        usage -= _read_stat(_CGROUP_ROOT / 'memory.stat', 'inactive_file')
+        return max(usage, 0), limit, 'cgroup2'
+
+    v1 = _CGROUP_ROOT / 'memory'
+    limit = _read_int(v1 / 'memory.limit_in_bytes')
+    if limit is not None and limit < _CGROUP_V1_UNLIMITED:
+        usage = _read_int(v1 / 'memory.usage_in_bytes') or 0
+        usage -= _read_stat(v1 / 'memory.stat', 'total_inactive_file')
+        return max(usage, 0), limit, 'cgroup1'
+
+    memory = psutil.virtual_memory()
+    return memory.total - memory.available, memory.total, 'host'
+
+class MemoryPressure:
+    """Фоновый замер давления на память.
+
+    Раз в MEMORY_SAMPLE_INTERVAL секунд читает использование и лимит
+    памяти и публикует уровень (level) и долю бюджета (budget_factor).
+    Кэши читают эти атрибуты вместо опроса psutil на каждой записи,
+    а при смене уровня вызываются подписчики add_listener.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MemoryPressure, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.level = PRESSURE_NORMAL
+            self.budget_factor = BUDGET_FACTORS[PRESSURE_NORMAL]
+            self.usage = 0
+            self.limit = 0
+            self.ratio = 0.0
+            self.source = None
+            self._interval = MEMORY_SAMPLE_INTERVAL
+            self._listeners: List[Callable[[int], None]] = []
+            self._initialized = True
+
+    def add_listener(self, callback: Callable[[int], None]) -> None:
+        """Подписка на смену уровня; callback получает новый уровень."""
+        self._listeners.append(callback)
+
+    def sample(self) -> int:
+        """Один замер и пересчёт уровня."""
+        self.usage, self.limit, self.source = read_memory_usage()
+        self.ratio = self.usage / self.limit if self.limit else 0.0
+        if self.ratio >= MEMORY_PRESSURE_CRITICAL:
+            level = PRESSURE_CRITICAL
+        elif self.ratio >= MEMORY_PRESSURE_HIGH:
+            level = PRESSURE_HIGH
+        else:
+            level = PRESSURE_NORMAL
+
+        if level != self.level:
+            logging.warning(
+                f"Давление на память: уровень {self.level} → {level} "
+                f"({self.usage / 1024 / 1024:.0f} из {self.limit / 1024 / 1024:.0f} МБ, {self.source})"
+            )
+            self.level = level
+            self.budget_factor = BUDGET_FACTORS[level]
+            for callback in self._listeners:
+                try:
+                    callback(level)
+                except Exception as e:
+                    logging.error(f"Ошибка в обработчике давления на память: {e}")
+        return level
+
+    async def run(self) -> None:
+        """Периодический замер давления на память."""
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logging.error(f"Ошибка при замере памяти: {e}")
+            await asyncio.sleep(self._interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Последний замер памяти."""
+        return {
+            "level": self.level,
+            "budget_factor": self.budget_factor,
+            "usage": self.usage,
+            "limit": self.limit,
+            "ratio": self.ratio,
+            "source": self.source
+        }
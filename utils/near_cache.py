@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+class NearCache:
+    """Ближний кэш (L1) значений, принадлежащих другим узлам кластера.
+
+    Хранит копии удаленных значений в процессе на короткий ttl, чтобы
+    повторные чтения не ходили по HTTP. Согласованность поддерживают
+    сообщения об инвалидации от узла-владельца; ttl ограничивает
+    устаревание, если сообщение потерялось. Размер ограничен max_entries
+    с вытеснением по LRU.
+
+    Попадания считаются по ключам: владелец ключа не видит чтений,
+    обслуженных копией, и узнает о них из take_hits при следующем запросе.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        # Попадания по ключам с последнего take_hits (только ключи из _entries
+        # и ключи, чей запрос к владельцу еще не отправлен)
+        self._hits: Dict[str, int] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations": 0
+        }
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        self._hits[key] = self._hits.get(key, 0) + 1
+        return value
+
+    def take_hits(self, key: str) -> int:
+        """Число попаданий по ключу с прошлого вызова; счетчик сбрасывается."""
+        return self._hits.pop(key, 0)
+
+    def put(self, key: str, value: Any) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._hits.pop(evicted, None)
+
+    def invalidate(self, keys: Iterable[str]) -> int:
+        removed = 0
+        for key in keys:
+            self._hits.pop(key, None)
+            if self._entries.pop(key, None) is not None:
+                removed += 1
+        self._stats["invalidations"] += removed
+        return removed
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._hits.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self._stats, items=len(self._entries), ttl=self.ttl)
@@ -1,10 +1,10 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 import uvicorn
-from typing import Dict, Any, Optional
-import asyncio
+from typing import Dict, Any
 import logging
 from .cluster_manager import ClusterManager
 from .cache_manager import CacheManager
+from . import wire_codec
 from pydantic import BaseModel
 
 app = FastAPI()
@@ -16,9 +16,49 @@ class NodeRegistration(BaseModel):
     host: str
     port: int
 
-class CacheItem(BaseModel):
-    value: Any
-    ttl: Optional[int] = None
+async def read_payload(request: Request) -> Dict[str, Any]:
+    """Тело запроса кэша в формате из Content-Type (см. wire_codec)."""
+    try:
+        payload = wire_codec.decode(
+            await request.body(),
+            request.headers.get('content-type'),
+            request.headers.get(wire_codec.COMPRESSION_HEADER)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid payload: object expected")
+    return payload
+
+def payload_response(request: Request, payload: Dict[str, Any]) -> Response:
+    """Ответ в формате и со сжатием, согласованными по заголовкам запроса."""
+    content_type = wire_codec.negotiate(request.headers.get('accept'))
+    compression = wire_codec.negotiate_compression(request.headers.get(wire_codec.ACCEPT_COMPRESSION_HEADER))
+    body, compression = wire_codec.encode(payload, content_type, (compression,) if compression else ())
+    headers = {wire_codec.ACCEPT_COMPRESSION_HEADER: wire_codec.ACCEPT_COMPRESSION}
+    if compression:
+        headers[wire_codec.COMPRESSION_HEADER] = compression
+    return Response(content=body, media_type=content_type, headers=headers)
+
+def _field(payload: Dict[str, Any], name: str, kind: type) -> Any:
+    value = payload.get(name)
+    if not isinstance(value, kind):
+        raise HTTPException(status_code=400, detail=f"Invalid payload: field '{name}' must be {kind.__name__}")
+    return value
+
+def _hits(payload: Dict[str, Any]) -> Dict[str, int]:
+    hits = payload.get("hits") or {}
+    if not isinstance(hits, dict) or not all(
+        isinstance(count, int) and not isinstance(count, bool) and count >= 0 for count in hits.values()
+    ):
+        raise HTTPException(status_code=400, detail="Invalid payload: field 'hits' must map keys to counts")
+    return hits
+
+def _ttl(payload: Dict[str, Any]):
+    ttl = payload.get("ttl")
+    if ttl is not None and (isinstance(ttl, bool) or not isinstance(ttl, (int, float))):
+        raise HTTPException(status_code=400, detail="Invalid payload: field 'ttl' must be a number")
+    return ttl
 
 @app.post("/node/register")
 async def register_node(node: NodeRegistration):
@@ -31,45 +71,96 @@ async def register_node(node: NodeRegistration):
 @app.post("/node/heartbeat/{node_id}")
 async def update_heartbeat(node_id: str, stats: Dict[str, float]):
     """Обновление heartbeat от узла."""
-    if node_id not in cluster_manager.nodes:
+    if not await cluster_manager.update_heartbeat(node_id, stats["load"], stats["memory_usage"]):
         raise HTTPException(status_code=404, detail="Node not found")
-    
-    node = cluster_manager.nodes[node_id]
-    node.load = stats["load"]
-    node.memory_usage = stats["memory_usage"]
-    node.last_heartbeat = asyncio.get_event_loop().time()
     return {"status": "success"}
 
+# Пакетные операции над локальным хранилищем: запрос приходит на узел-владелец
+# ключей от CacheManager.get_many / set_many / delete_many. Тела запросов и
+# ответов кэша — в согласованном формате wire_codec (JSON для прочих клиентов)
+@app.post("/cache/batch/get")
+async def get_cache_batch(request: Request):
+    """Получение нескольких значений из кэша (только найденные ключи).
+
+    hits — чтения ключей из ближнего кэша узла-клиента (учет горячих ключей).
+    """
+    payload = await read_payload(request)
+    keys = _field(payload, "keys", list)
+    return payload_response(request, {
+        "values": cache_manager.get_many_local(keys, _hits(payload)),
+        "replicas": cache_manager.replica_routes(keys)
+    })
+
+@app.post("/cache/batch/set")
+async def set_cache_batch(request: Request):
+    """Сохранение нескольких значений в кэш."""
+    payload = await read_payload(request)
+    items = _field(payload, "items", dict)
+    return payload_response(request, {"stored": cache_manager.set_many_local(items, _ttl(payload))})
+
+@app.post("/cache/batch/delete")
+async def delete_cache_batch(request: Request):
+    """Удаление нескольких значений из кэша."""
+    keys = _field(await read_payload(request), "keys", list)
+    return payload_response(request, {"deleted": cache_manager.delete_many_local(keys)})
+
+@app.post("/cache/batch/invalidate")
+async def invalidate_cache_batch(request: Request):
+    """Инвалидация копий в ближнем кэше по сообщению узла-владельца."""
+    keys = _field(await read_payload(request), "keys", list)
+    return payload_response(request, {"invalidated": cache_manager.invalidate_near(keys)})
+
+@app.post("/cache/batch/hits")
+async def hits_cache_batch(request: Request):
+    """Чтения ключей этого узла, обслуженные репликами на узле-клиенте."""
+    return payload_response(request, {"recorded": cache_manager.record_hits(_hits(await read_payload(request)))})
+
+@app.post("/cache/batch/replicate")
+async def replicate_cache_batch(request: Request):
+    """Запись и удаление копий горячих ключей по сообщению узла-владельца."""
+    payload = await read_payload(request)
+    items = _field(payload, "items", dict)
+    ttls = _field(payload, "ttls", dict)
+    deleted = _field(payload, "deleted", list)
+    return payload_response(request, {"replicated": cache_manager.replicate_local(items, ttls, deleted)})
+
 @app.get("/cache/{key}")
-async def get_cache(key: str):
-    """Получение значения из кэша."""
-    value = await cache_manager.get(key)
+async def get_cache(key: str, request: Request, hits: int = Query(0, ge=0)):
+    """Получение значения из кэша; для горячего ключа — и узлы с его копиями.
+
+    hits — чтения ключа из ближнего кэша узла-клиента (учет горячих ключей).
+    """
+    value = await cache_manager.get_for_peer(key, hits)
     if value is None:
         raise HTTPException(status_code=404, detail="Key not found")
-    return {"value": value}
+    return payload_response(request, {"value": value, "replicas": cache_manager.replica_routes([key])})
 
 @app.post("/cache/{key}")
-async def set_cache(key: str, item: CacheItem):
+async def set_cache(key: str, request: Request):
     """Сохранение значения в кэш."""
-    success = await cache_manager.set(key, item.value, item.ttl)
+    payload = await read_payload(request)
+    if "value" not in payload:
+        raise HTTPException(status_code=400, detail="Invalid payload: field 'value' is required")
+    success = await cache_manager.set(key, payload["value"], _ttl(payload))
     if not success:
         raise HTTPException(status_code=500, detail="Failed to set cache")
-    return {"status": "success"}
+    return payload_response(request, {"status": "success"})
 
 @app.delete("/cache/{key}")
-async def delete_cache(key: str):
+async def delete_cache(key: str, request: Request):
     """Удаление значения из кэша."""
     success = await cache_manager.delete(key)
     if not success:
         raise HTTPException(status_code=404, detail="Key not found")
-    return {"status": "success"}
+    return payload_response(request, {"status": "success"})
 
 @app.get("/stats")
 async def get_stats():
     """Получение статистики узла."""
     return {
         "cluster": cluster_manager.get_cluster_stats(),
-        "cache": cache_manager.get_stats()
+        "cache": cache_manager.get_stats(),
+        "replication": cache_manager.get_replication_stats()
     }
 
 def start_node_api(host: str, port: int):
@@ -0,0 +1,24 @@
+import sys
+from typing import Any
+
+# Глубже этого уровня вложенности объекты не обходятся
+_MAX_DEPTH = 8
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Приблизительный размер значения в байтах.
+
+    Учитываются сам объект и содержимое словарей, списков, кортежей и
+    множеств; общие объекты считаются в каждом месте использования, поэтому
+    оценка сверху. Для лимитов кэша этого достаточно, а обход в разы
+    дешевле точного подсчёта с учётом уже посещённых объектов.
+    """
+    size = sys.getsizeof(value)
+    if _depth >= _MAX_DEPTH:
+        return size
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key, _depth + 1) + estimate_size(item, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item, _depth + 1)
+    return size
@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+from typing import Any, Dict, List
+
+# Код карты хранится одним байтом, 0 не используется
+MAX_CARD_CODE = 255
+
+class SpreadCodec:
+    """Словари кодов карт и тем для компактного хранения раскладов.
+
+    Расклад хранится как BLOB, где каждая карта — один байт (три карты —
+    три байта), а тема — небольшое целое число. Коды выдаются по мере
+    появления новых названий и записываются в таблицы card_dict и
+    theme_dict той же базы, поэтому файл базы самодостаточен.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._card_codes: Dict[str, int] = {}
+        self._card_names: Dict[int, str] = {}
+        self._theme_codes: Dict[str, int] = {}
+        self._theme_names: Dict[int, str] = {}
+        self._loaded = False
+
+    @staticmethod
+    def create_tables(conn: sqlite3.Connection) -> None:
+        """Создание таблиц словарей."""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS card_dict (
+                code INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS theme_dict (
+                code INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """Загрузка словарей из базы в память."""
+        cards = conn.execute('SELECT code, name FROM card_dict').fetchall()
+        themes = conn.execute('SELECT code, name FROM theme_dict').fetchall()
+        with self._lock:
+            self._card_names = dict(cards)
+            self._card_codes = {name: code for code, name in cards}
+            self._theme_names = dict(themes)
+            self._theme_codes = {name: code for code, name in themes}
+            self._loaded = True
+
+    def invalidate(self) -> None:
+        """Сброс словарей в памяти (например, после отката транзакции)."""
+        with self._lock:
+            self._loaded = False
+
+    def _ensure_loaded(self, conn: sqlite3.Connection) -> None:
+        if not self._loaded:
+            self.load(conn)
+
+    @staticmethod
+    def check_name(name: Any, kind: str) -> None:
+        """Название карты или темы должно быть непустой строкой.
+
+        INSERT OR IGNORE в _assign молча пропустил бы NULL, и код не нашелся бы.
+        """
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"Недопустимое название {kind}: {name!r}")
+
+    @classmethod
+    def check_spread(cls, theme: Any, names: Any) -> None:
+        """Проверка расклада до постановки в очередь записи."""
+        cls.check_name(theme, 'темы')
+        if not isinstance(names, list):
+            raise ValueError(f"Карты расклада должны быть списком: {names!r}")
+        for name in names:
+            cls.check_name(name, 'карты')
+
+    def _assign(self, conn: sqlite3.Connection, table: str, name: str) -> int:
+        """Выдача кода новому названию в рамках текущей транзакции записи."""
+        conn.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+        return conn.execute(f'SELECT code FROM {table} WHERE name = ?', (name,)).fetchone()[0]
+
+    def card_code(self, conn: sqlite3.Connection, name: str) -> int:
+        self._ensure_loaded(conn)
+        code = self._card_codes.get(name)
+        if code is None:
+            self.check_name(name, 'карты')
+            code = self._assign(conn, 'card_dict', name)
+            if code > MAX_CARD_CODE:
+                raise ValueError(f"Слишком много различных карт для однобайтового кода: {name}")
+            with self._lock:
+                self._card_codes[name] = code
+                self._card_names[code] = name
+        return code
+
+    def theme_code(self, conn: sqlite3.Connection, name: str) -> int:
+        self._ensure_loaded(conn)
+        code = self._theme_codes.get(name)
+        if code is None:
+            self.check_name(name, 'темы')
+            code = self._assign(conn, 'theme_dict', name)
+            with self._lock:
+                self._theme_codes[name] = code
+                self._theme_names[code] = name
+        return code
+
+    def encode_cards(self, conn: sqlite3.Connection, names: List[str]) -> bytes:
+        """Упаковка списка карт в BLOB по байту на карту."""
+        return bytes(self.card_code(conn, name) for name in names)
+
+    def decode_cards(self, conn: sqlite3.Connection, blob: bytes) -> List[str]:
+        """Распаковка BLOB обратно в список английских названий карт."""
+        names = self._card_names
+        try:
+            return [names[code] for code in blob]
+        except KeyError:
+            # Словарь не загружен или код выдан другим соединением после загрузки
+            self.load(conn)
+            return [self._card_names[code] for code in blob]
+
+    def theme_name(self, conn: sqlite3.Connection, code: int) -> str:
+        try:
+            return self._theme_names[code]
+        except KeyError:
+            self.load(conn)
+            return self._theme_names[code]
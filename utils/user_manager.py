@@ -1,10 +1,14 @@
 import logging
 import asyncio
 from datetime import datetime, date
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
+from config import MAX_DAILY_SPREADS
 from .database import Database
 from .cache_manager import CacheManager
 
+# Время жизни записей пользователей в кэше (30 минут)
+USER_CACHE_TTL = 1800
+
 class UserManager:
     _instance = None
     _initialized = False
@@ -20,102 +24,80 @@ class UserManager:
             self.db = Database()
             self.cache = CacheManager()
             self._initialized = True
-            # Устанавливаем TTL для кэша пользователей (30 минут)
-            self.cache.set_default_ttl(1800)
 
     async def get_user(self, user_id: int) -> Dict:
         """Получение информации о пользователе."""
         try:
-            # Пробуем получить из кэша
-            cache_key = f"user_{user_id}"
-            user = await self.cache.get(cache_key)
-            if user:
-                logging.info(f"Получены данные пользователя {user_id} из кэша: {user}")
-                return user
-
-            # Если нет в кэше, получаем из базы
-            user = await self.db.get_user(user_id)
-            if not user:
-                # Создаем нового пользователя с дефолтными настройками
-                default_user = {
-                    "theme": "light",
-                    "show_images": True,
-                    "daily_prediction": False,
-                    "spreads_today": 0,
-                    "last_spread_date": None
-                }
-                logging.info(f"Создан новый пользователь {user_id} с настройками: {default_user}")
-                # Сохраняем в базу данных
-                success = await self.db.update_user(user_id=user_id, **default_user)
-                if success:
-                    user = default_user
-                else:
-                    logging.error(f"Не удалось создать пользователя {user_id} в базе данных")
-                    return default_user
-            
-            logging.info(f"Получены данные пользователя {user_id} из БД: {user}")
-            
-            # Сохраняем в кэш
-            await self.cache.set(cache_key, user)
+            # Одновременные промахи кэша по пользователю делят одну загрузку из БД
+            user = await self.cache.get_or_load(
+                f"user_{user_id}", lambda: self._load_user(user_id), ttl=USER_CACHE_TTL
+            )
+            if user is None:
+                return self._default_user()
             return user
             
         except Exception as e:
             logging.error(f"Ошибка при получении пользователя {user_id}: {e}")
             # Возвращаем дефолтные настройки в случае ошибки
-            return {
-                "theme": "light",
-                "show_images": True,
-                "daily_prediction": False,
-                "spreads_today": 0,
-                "last_spread_date": None
-            }
+            return self._default_user()
 
-    async def can_make_spread(self, user_id: int) -> bool:
-        """Проверка возможности сделать расклад."""
-        user = await self.get_user(user_id)
-        today = date.today().isoformat()
+    @staticmethod
+    def _default_user() -> Dict:
+        """Настройки нового пользователя."""
+        return {
+            "theme": "light",
+            "show_images": True,
+            "daily_prediction": False,
+            "spreads_today": 0,
+            "last_spread_date": None
+        }
+
+    async def _load_user(self, user_id: int) -> Optional[Dict]:
+        """Загрузка пользователя из БД; новый пользователь создается.
+
+        None — пользователя не удалось создать (в кэш не попадает).
+        """
+        user = await self.db.get_user(user_id)
+        if not user:
+            # Создаем нового пользователя с дефолтными настройками
+            default_user = self._default_user()
+            logging.info(f"Создан новый пользователь {user_id} с настройками: {default_user}")
+            # Сохраняем в базу данных
+            success = await self.db.update_user(user_id=user_id, **default_user)
+            if not success:
+                logging.error(f"Не удалось создать пользователя {user_id} в базе данных")
+                return None
+            user = default_user
         
-        if user['last_spread_date'] != today:
-            # Сбрасываем счетчик в начале нового дня
-            await self.update_user(user_id, spreads_today=0, last_spread_date=today)
-            return True
-            
-        return user['spreads_today'] < 3  # Максимум 3 расклада в день
+        logging.info(f"Получены данные пользователя {user_id} из БД: {user}")
+        return user
 
-    async def increment_spreads(self, user_id: int) -> None:
-        """Увеличение счетчика раскладов."""
-        user = await self.get_user(user_id)
+    async def reserve_spread(self, user_id: int) -> bool:
+        """Атомарная проверка лимита и учет расклада одним запросом к БД.
+
+        False — лимит на сегодня исчерпан; ошибка базы данных пробрасывается.
+        """
         today = date.today().isoformat()
-        
-        if user['last_spread_date'] != today:
-            # Новый день - сбрасываем счетчик
-            await self.update_user(
-                user_id,
-                spreads_today=1,
-                last_spread_date=today
-            )
-        else:
-            # Увеличиваем счетчик
-            await self.update_user(
-                user_id,
-                spreads_today=user['spreads_today'] + 1
-            )
+        user = await self.db.reserve_spread(user_id, MAX_DAILY_SPREADS, today)
+        if user is None:
+            return False
+
+        # Обновляем кэш строкой, которую вернула база данных
+        await self.cache.set(f"user_{user_id}", user, ttl=USER_CACHE_TTL)
+        return True
 
     async def update_user(self, user_id: int, **kwargs) -> bool:
         """Обновление настроек пользователя."""
         try:
-            # Обновляем в базе данных
-            success = await self.db.update_user(user_id, **kwargs)
-            if success:
-                # Обновляем кэш
-                cache_key = f"user_{user_id}"
-                user = await self.get_user(user_id)
-                await self.cache.set(cache_key, user)
-                
-                # Если изменился статус подписки на рассылку, обновляем кэш подписчиков
-                if 'daily_prediction' in kwargs:
-                    await self.cache.delete('daily_subscribers')
-            return success
+            # Запись уходит в очередь группового коммита базы данных
+            self.db.enqueue_user_update(user_id, **kwargs)
+
+            # Обновляем кэш
+            cache_key = f"user_{user_id}"
+            user = dict(await self.get_user(user_id))
+            user.update(kwargs)
+            await self.cache.set(cache_key, user, ttl=USER_CACHE_TTL)
+            return True
         except Exception as e:
             logging.error(f"Ошибка при обновлении пользователя {user_id}: {e}")
             return False
@@ -127,24 +109,11 @@ class UserManager:
         success = await self.update_user(user_id, daily_prediction=new_state)
         return new_state if success else user['daily_prediction']
 
-    async def get_daily_prediction_subscribers(self) -> List[int]:
-        """Получение списка подписчиков на ежедневные предсказания."""
-        try:
-            # Пробуем получить из кэша
-            subscribers = await self.cache.get('daily_subscribers')
-            if subscribers is not None:
-                return subscribers
-
-            # Если нет в кэше, получаем из базы
-            subscribers = await self.db.get_daily_subscribers()
-            
-            # Сохраняем в кэш на 5 минут
-            await self.cache.set('daily_subscribers', subscribers, ttl=300)
-            return subscribers
-            
-        except Exception as e:
-            logging.error(f"Ошибка при получении списка подписчиков: {e}")
-            return [] 
+    async def iter_daily_prediction_subscribers(self, batch_size: int = 1000,
+                                                after_id: int = 0) -> AsyncIterator[List[int]]:
+        """Потоковое получение подписчиков пачками для рассылки (без кэширования)."""
+        async for batch in self.db.iter_daily_subscribers(batch_size, after_id):
+            yield batch
 
     async def update_preferences(self, user_id: int, **preferences):
         """Обновляет настройки пользователя."""
@@ -177,14 +146,9 @@ class UserManager:
                 
                 # Обновляем кэш
                 cache_key = f"user_{user_id}"
-                await self.cache.set(cache_key, updated_user)
+                await self.cache.set(cache_key, updated_user, ttl=USER_CACHE_TTL)
                 logging.info(f"Кэш обновлен для пользователя {user_id}: {updated_user}")
                 
-                # Если изменился статус подписки на рассылку, обновляем кэш подписчиков
-                if 'daily_prediction' in valid_preferences:
-                    await self.cache.delete('daily_subscribers')
-                    logging.info("Кэш подписчиков очищен")
-                
                 return updated_user
             else:
                 logging.error(f"Не удалось обновить настройки в БД для пользователя {user_id}")
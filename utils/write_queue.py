@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .db_pool import ConnectionPool
+
+class WriteBehindQueue:
+    """Очередь отложенной записи с групповым коммитом.
+
+    Обновления пользователей склеиваются по user_id, расклады копятся
+    списком. Всё накопленное записывается одной транзакцией раз в
+    flush_interval секунд или сразу, как только набралось max_batch строк.
+    Временные ошибки SQLite (блокировка, диск) повторяются не больше
+    max_retries раз; после этого или при ошибке в данных пачка пишется
+    по одной строке, а строки, которые не записываются, отбрасываются
+    с записью в лог, чтобы не задерживать остальные.
+    """
+
+    def __init__(self, pool: ConnectionPool, apply_batch: Callable,
+                 flush_interval: float = 0.05, max_batch: int = 200, max_retries: int = 3):
+        self._pool = pool
+        self._apply_batch = apply_batch
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._max_retries = max_retries
+        self._retries = 0
+        self._users: Dict[int, Dict[str, Any]] = {}
+        self._spreads: List[Tuple[int, str, str, int]] = []
+        # Пачка, которая сейчас записывается, остаётся видимой для чтения
+        self._inflight_users: Dict[int, Dict[str, Any]] = {}
+        self._inflight_spreads: List[Tuple[int, str, str, int]] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "flushes": 0,
+            "failed_flushes": 0,
+            "rows_flushed": 0,
+            "dropped_rows": 0,
+            "last_flush_latency": 0.0,
+            "max_flush_latency": 0.0,
+            "total_flush_latency": 0.0
+        }
+
+    @property
+    def depth(self) -> int:
+        """Количество строк, ожидающих записи."""
+        return len(self._users) + len(self._spreads)
+
+    def put_user(self, user_id: int, fields: Dict[str, Any]) -> None:
+        """Постановка в очередь обновления пользователя."""
+        self._users.setdefault(user_id, {}).update(fields)
+        self._notify()
+
+    def put_spread(self, user_id: int, theme: str, cards: str, created_at: int) -> None:
+        """Постановка в очередь нового расклада."""
+        self._spreads.append((user_id, theme, cards, created_at))
+        self._notify()
+
+    def discard_user_fields(self, user_id: int, fields) -> None:
+        """Отмена отложенных изменений полей, которые записываются напрямую."""
+        pending = self._users.get(user_id)
+        if pending:
+            for field in fields:
+                pending.pop(field, None)
+            if not pending:
+                del self._users[user_id]
+
+    def pending_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Ещё не записанные изменения пользователя."""
+        inflight = self._inflight_users.get(user_id)
+        pending = self._users.get(user_id)
+        if inflight and pending:
+            return dict(inflight, **pending)
+        return pending or inflight
+
+    def pending_last_spread(self, user_id: int) -> Optional[Tuple[int, str, str, int]]:
+        """Последний ещё не записанный расклад пользователя."""
+        for spreads in (self._spreads, self._inflight_spreads):
+            for spread in reversed(spreads):
+                if spread[0] == user_id:
+                    return spread
+        return None
+
+    def _notify(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self.depth >= self._max_batch:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        """Фоновый цикл сброса очереди; завершается, когда очередь пуста.
+
+        Следующая постановка в очередь запускает цикл заново (_notify).
+        """
+        while self.depth:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _take_batch(self) -> Tuple[Dict[int, Dict[str, Any]], List[Tuple[int, str, str, int]]]:
+        users, spreads = self._users, self._spreads
+        self._users, self._spreads = {}, []
+        return users, spreads
+
+    def _requeue(self, users: Dict[int, Dict[str, Any]], spreads: List[Tuple[int, str, str, int]]) -> None:
+        """Возврат несохранённой пачки в очередь без потери более новых изменений."""
+        for user_id, fields in users.items():
+            merged = dict(fields)
+            merged.update(self._users.get(user_id, {}))
+            self._users[user_id] = merged
+        self._spreads = spreads + self._spreads
+
+    def _record_flush(self, rows: int, latency: float) -> None:
+        self._stats["flushes"] += 1
+        self._stats["rows_flushed"] += rows
+        self._stats["last_flush_latency"] = latency
+        self._stats["max_flush_latency"] = max(self._stats["max_flush_latency"], latency)
+        self._stats["total_flush_latency"] += latency
+
+    def _should_retry(self, error: Exception) -> bool:
+        """Повтор пачки целиком — только для временных ошибок и не больше max_retries раз."""
+        if isinstance(error, sqlite3.OperationalError) and self._retries < self._max_retries:
+            self._retries += 1
+            return True
+        self._retries = 0
+        return False
+
+    @staticmethod
+    def _split_rows(users: Dict[int, Dict[str, Any]], spreads: List[Tuple[int, str, str, int]]):
+        """Пачка по одной строке: (users, spreads) для отдельных транзакций."""
+        for user_id, fields in users.items():
+            yield {user_id: fields}, []
+        for spread in spreads:
+            yield {}, [spread]
+
+    def _drop_row(self, users: Dict[int, Dict[str, Any]], spreads: List[Tuple[int, str, str, int]],
+                  error: Exception) -> None:
+        self._stats["dropped_rows"] += 1
+        logging.error(f"Строка очереди записи отброшена: users={users} spreads={spreads}: {error}")
+
+    async def _flush_rows(self, users: Dict[int, Dict[str, Any]], spreads: List[Tuple[int, str, str, int]]) -> int:
+        """Запись пачки по одной строке; возвращает число записанных строк."""
+        written = 0
+        for row_users, row_spreads in self._split_rows(users, spreads):
+            try:
+                await self._pool.write(self._apply_batch, row_users, row_spreads)
+                written += 1
+            except Exception as e:
+                self._drop_row(row_users, row_spreads, e)
+        return written
+
+    def _flush_rows_sync(self, users: Dict[int, Dict[str, Any]], spreads: List[Tuple[int, str, str, int]]) -> int:
+        written = 0
+        for row_users, row_spreads in self._split_rows(users, spreads):
+            try:
+                self._pool.write_sync(self._apply_batch, row_users, row_spreads)
+                written += 1
+            except Exception as e:
+                self._drop_row(row_users, row_spreads, e)
+        return written
+
+    async def flush(self) -> None:
+        """Запись всего накопленного одной транзакцией."""
+        async with self._flush_lock:
+            if not self.depth:
+                return
+            users, spreads = self._take_batch()
+            self._inflight_users, self._inflight_spreads = users, spreads
+            start_time = time.perf_counter()
+            try:
+                try:
+                    await self._pool.write(self._apply_batch, users, spreads)
+                    rows = len(users) + len(spreads)
+                    self._retries = 0
+                except Exception as e:
+                    self._stats["failed_flushes"] += 1
+                    if self._should_retry(e):
+                        self._requeue(users, spreads)
+                        logging.warning(f"Ошибка при сбросе очереди записи, повтор {self._retries}: {e}")
+                        return
+                    logging.error(f"Ошибка при сбросе очереди записи, запись по одной строке: {e}")
+                    rows = await self._flush_rows(users, spreads)
+            finally:
+                self._inflight_users, self._inflight_spreads = {}, []
+            self._record_flush(rows, time.perf_counter() - start_time)
+
+    def flush_sync(self) -> None:
+        """Синхронный сброс очереди при остановке бота."""
+        if not self.depth:
+            return
+        users, spreads = self._take_batch()
+        start_time = time.perf_counter()
+        try:
+            self._pool.write_sync(self._apply_batch, users, spreads)
+            rows = len(users) + len(spreads)
+        except Exception as e:
+            self._stats["failed_flushes"] += 1
+            logging.error(f"Ошибка при сбросе очереди записи, запись по одной строке: {e}")
+            rows = self._flush_rows_sync(users, spreads)
+        self._record_flush(rows, time.perf_counter() - start_time)
+
+    def stop(self) -> None:
+        """Остановка фонового цикла (без сброса)."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очереди и задержки сброса."""
+        flushes = self._stats["flushes"]
+        return {
+            "queue_depth": self.depth,
+            "pending_users": len(self._users),
+            "pending_spreads": len(self._spreads),
+            "flushes": flushes,
+            "failed_flushes": self._stats["failed_flushes"],
+            "rows_flushed": self._stats["rows_flushed"],
+            "dropped_rows": self._stats["dropped_rows"],
+            "last_flush_latency": self._stats["last_flush_latency"],
+            "max_flush_latency": self._stats["max_flush_latency"],
+            "avg_flush_latency": self._stats["total_flush_latency"] / flushes if flushes else 0.0
+        }